@@ -8,11 +8,11 @@ import tcod.event
 import color
 import exceptions
 from config import Config
-from entity import Torch
+from entity import Item, Torch
 
 if TYPE_CHECKING:
     from engine import Engine
-    from entity import Actor, Entity, Item
+    from entity import Actor, Entity
 
 
 class Action:
@@ -48,16 +48,14 @@ class PickupAction(Action):
         super().__init__(entity)
 
     def perform(self) -> None:
-        actor_location_x = self.entity.x
-        actor_location_y = self.entity.y
         inventory = self.entity.inventory
 
-        for item in self.engine.game_map.items:
-            if actor_location_x == item.x and actor_location_y == item.y:
+        for item in self.engine.game_map.get_entities_at_location(*self.entity.position):
+            if isinstance(item, Item):
                 if len(inventory.items) >= inventory.capacity:
                     raise exceptions.Impossible("Your inventory is full.")
 
-                self.engine.game_map.entities.remove(item)
+                self.engine.game_map.remove_entity(item)
                 item.parent = self.entity.inventory
                 inventory.items.append(item)
 
@@ -131,33 +129,43 @@ class TakeStairsAction(Action):
         """
         Take the stairs, if any exist at the entity's location.
         """
+        game_world = self.engine.game_world
         if (self.entity.x, self.entity.y) == self.engine.game_map.downstairs_location:
-            player = self.engine.player
-            amount = min(self.engine.game_world.current_floor * 15, int(player.fighter.max_hp * 0.5))
-            if (heal := player.fighter.heal(amount)) > 0:
-                self.engine.message_log.add_message(
-                    f"You take a moment to rest, and recover your health {int(heal)}.",
-                    color.descend,
-                )
-            else:
-                self.engine.message_log.add_message(f"You are full of strength.", color.descend)
-
-            amount = min(self.engine.game_world.current_floor * 20, int(player.fighter.max_mp * 0.5))
-            if (restore := player.fighter.restore_mana(amount)) > 0:
-                self.engine.message_log.add_message(
-                    f"You take a moment to rest, and restore your mana storage {restore}.",
-                    color.descend,
-                )
-            else:
-                self.engine.message_log.add_message(f"You are full of magic.", color.descend)
-
-            self.engine.game_world.generate_floor()
+            # Resting only happens before going down to a new floor.
+            if game_world.current_floor + 1 not in game_world.visited_floors:
+                self.rest()
+            game_world.generate_floor()
             self.engine.message_log.add_message(
                 "You descend the staircase.", color.descend
             )
+        elif (self.entity.x, self.entity.y) == self.engine.game_map.upstairs_location:
+            game_world.change_floor(game_world.current_floor - 1)
+            self.engine.message_log.add_message(
+                "You ascend the staircase.", color.descend
+            )
         else:
             raise exceptions.Impossible("There are no stairs here.")
 
+    def rest(self) -> None:
+        player = self.engine.player
+        amount = min(self.engine.game_world.current_floor * 15, int(player.fighter.max_hp * 0.5))
+        if (heal := player.fighter.heal(amount)) > 0:
+            self.engine.message_log.add_message(
+                f"You take a moment to rest, and recover your health {int(heal)}.",
+                color.descend,
+            )
+        else:
+            self.engine.message_log.add_message(f"You are full of strength.", color.descend)
+
+        amount = min(self.engine.game_world.current_floor * 20, int(player.fighter.max_mp * 0.5))
+        if (restore := player.fighter.restore_mana(amount)) > 0:
+            self.engine.message_log.add_message(
+                f"You take a moment to rest, and restore your mana storage {restore}.",
+                color.descend,
+            )
+        else:
+            self.engine.message_log.add_message(f"You are full of magic.", color.descend)
+
     @staticmethod
     def action_name():
         return "TakeStairsAction"
@@ -287,7 +295,7 @@ class PlaceTorchAction(Action):
     def perform(self) -> None:
         for entity in self.engine.game_map.get_entities_at_location(*self.entity.position):
             if isinstance(entity, Torch):
-                self.engine.game_map.entities.remove(entity)
+                self.engine.game_map.remove_entity(entity)
                 return
         torch = Torch(r=Config.torch_radius)
         torch.place(self.entity.x, self.entity.y, self.engine.game_map)
@@ -0,0 +1,309 @@
+"""Crash safe autosave: a full save per floor plus an append-only journal of what changes every turn.
+
+Entering a floor writes the whole game with `savegame`, in the background, and starts a new journal, so the
+journal never grows beyond one floor. After every turn only the differences are appended: entity moves, removals,
+deaths and other changes of their records, HP/MP/EP, pickups and drops, inventory and equipment of item holders,
+player progress, newly explored tiles and new messages. The map tells which entities changed (`pop_changed`), the
+others aren't looked at. A record costs a few hundred bytes and well under a millisecond.
+
+`recover` loads the floor save and replays the journal. Actor effects, AI state and the random streams are not
+journaled, they come back as they were when the floor started.
+
+Journal file: the magic, then frames of a u32 length and a pickle, the first frame is the header identifying the
+save it belongs to. A frame cut by a crash ends the replay.
+"""
+from __future__ import annotations
+
+import pickle
+import struct
+from concurrent.futures import Future
+from typing import BinaryIO, Optional
+
+import numpy as np  # type: ignore
+
+import color
+from config import Config
+from engine import Engine
+from entity import Actor, Entity
+from message_log import Message
+from render_order import RenderOrder
+import savegame
+
+MAGIC = b"DWJRNL"
+VERSION = 1
+
+FRAME = struct.Struct("<I")
+
+
+class Autosave:
+    def __init__(self, filename: str, journal_filename: str):
+        self.filename = filename
+        self.journal_filename = journal_filename
+
+        self.engine: Optional[Engine] = None
+        self._journal: Optional[BinaryIO] = None
+        self._floor = 0
+        self._turn = 0
+
+        # State at the last record, compared to the current one after every turn.
+        self._entities: list[Entity] = []
+        self._indexes: dict[int, int] = {}
+        self._records: list[tuple] = []
+        self._holdings: dict[int, tuple] = {}
+        self._progress: tuple = ()
+        self._explored: Optional[np.ndarray] = None
+        self._messages = 0
+        self._last_count = 0
+
+    def update(self, engine: Engine) -> None:
+        """Write a full save when a game or floor starts, else journal the turns played since the last call."""
+        if not engine.player.is_alive:
+            return
+        if engine is not self.engine or engine.game_world.current_floor != self._floor:
+            self.snapshot(engine)
+        elif engine.turn != self._turn:
+            self.record_turn()
+
+    def snapshot(self, engine: Engine) -> None:
+        """Save the whole game and start a new journal from it.
+
+        Only the snapshot is taken here, the save is compressed and written in the background.
+        """
+        snapshot = savegame.snapshot(engine)
+        savegame.write_in_background(
+            self.filename, snapshot, Config.save_compressor, lambda future: self._on_saved(engine, future)
+        )
+        entities = snapshot.entities
+
+        self.engine = engine
+        self._floor = engine.game_world.current_floor
+        self._turn = engine.turn
+        self._entities = entities
+        self._indexes = {id(entity): index for index, entity in enumerate(entities)}
+        self._records = [self._record(entity) for entity in entities]
+        self._holdings = {
+            index: self._holding(entity) for index, entity in enumerate(entities) if self._holds_items(entity)
+        }
+        self._progress = self._player_progress()
+        self._explored = engine.game_map.explored.copy()
+        engine.game_map.track_changes()
+        self._messages = len(engine.message_log)
+        recent = engine.message_log.recent
+        self._last_count = recent[-1].count if recent else 0
+
+        self.close()
+        self._journal = open(self.journal_filename, "wb")
+        self._journal.write(MAGIC)
+        self._write({"version": VERSION, "seed": engine.seed, "floor": self._floor, "turn": self._turn})
+
+    @staticmethod
+    def _on_saved(engine: Engine, future: Future) -> None:
+        if future.exception() is not None:
+            engine.message_log.add_message(f"Autosave failed: {future.exception()}", color.error)
+        else:
+            engine.message_log.add_message("Game saved.", color.game_saved)
+
+    def record_turn(self) -> None:
+        """Append what changed since the last record to the journal.
+
+        Only the entities the map reports as changed are compared, not all of them.
+        """
+        engine = self.engine
+        changed = []
+        added = []
+        for entity in engine.game_map.pop_changed():
+            index = self._indexes.get(id(entity))
+            if index is None:
+                added.append(self._add_entity(entity))
+                continue
+            record = self._record(entity)
+            if record != self._records[index]:
+                self._records[index] = record
+                changed.append((index, record))
+
+        holdings = []
+        for index in self._holdings:
+            holding = self._holding(self._entities[index])
+            if holding != self._holdings[index]:
+                self._holdings[index] = holding
+                holdings.append((index, holding))
+
+        progress = self._player_progress()
+        if progress == self._progress:
+            progress = None
+        else:
+            self._progress = progress
+
+        explored = engine.game_map.explored
+        newly_explored = np.flatnonzero((explored & ~self._explored).ravel(order="F")).astype(np.uint32)
+        if newly_explored.size:
+            self._explored |= explored
+
+        log = engine.message_log
+        recent = log.recent
+        # The last known message can have stacked since, so it is written again with its count.
+        first = max(0, self._messages - 1)
+        if len(log) != self._messages or (recent and recent[-1].count != self._last_count):
+            new_messages = [(message.plain_text, message.fg, message.count) for message in log.since(first)]
+        else:
+            new_messages = []
+        self._messages = len(log)
+        self._last_count = recent[-1].count if recent else 0
+
+        self._turn = engine.turn
+        self._write((
+            engine.turn, changed, added, holdings, progress, newly_explored.tobytes(), first, new_messages
+        ))
+
+    def close(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _write(self, obj: object) -> None:
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        self._journal.write(FRAME.pack(len(data)) + data)
+        self._journal.flush()
+
+    def _add_entity(self, entity: Entity) -> tuple:
+        """Start tracking an entity created during the floor, e.g. a torch, and return its journal entry."""
+        index = len(self._entities)
+        self._entities.append(entity)
+        self._indexes[id(entity)] = index
+        record = self._record(entity)
+        self._records.append(record)
+        # Entities created during a floor don't carry components, their attributes are plain data.
+        state = {key: value for key, value in entity.__dict__.items() if key != "parent"}
+        return index, savegame.ENTITY_KINDS.index(type(entity)), record, state
+
+    def _record(self, entity: Entity) -> tuple:
+        parent = getattr(entity, "parent", None)
+        if parent is not None and parent is self.engine.game_map:
+            # A removed entity keeps the map as its parent.
+            location = ("map",) if entity in parent.entities else None
+        elif id(getattr(parent, "parent", None)) in self._indexes:
+            location = ("inventory", self._indexes[id(parent.parent)])
+        else:
+            location = None
+
+        vitals = None
+        if isinstance(entity, Actor):
+            vitals = entity.fighter._hp, entity.fighter._mp, entity.fighter._ep
+        return (
+            entity.x, entity.y, entity.char, entity.color, entity.name, entity.blocks_movement, entity.render_order,
+            location, vitals,
+        )
+
+    @staticmethod
+    def _holds_items(entity: Entity) -> bool:
+        return isinstance(entity, Actor) and entity.inventory.capacity > 0
+
+    def _holding(self, actor: Actor) -> tuple:
+        indexes = self._indexes
+        return (
+            tuple(indexes.get(id(item), -1) for item in actor.inventory.items),
+            tuple(indexes.get(id(item), -1) if item is not None else None for item in actor.inventory.slots),
+            tuple((slot, indexes.get(id(item), -1)) for slot, item in actor.equipment.items.items()),
+        )
+
+    def _player_progress(self) -> tuple:
+        player = self.engine.player
+        stats = {key: value for key, value in vars(player.fighter.stats).items() if key != "_params"}
+        return player.level.current_level, player.level.current_xp, stats
+
+
+def _read_frames(data: bytes) -> list:
+    frames = []
+    offset = len(MAGIC)
+    while offset + FRAME.size <= len(data):
+        (length,) = FRAME.unpack_from(data, offset)
+        offset += FRAME.size
+        if offset + length > len(data):
+            break  # Cut by a crash.
+        frames.append(pickle.loads(data[offset:offset + length]))
+        offset += length
+    return frames
+
+
+def _replay(engine: Engine, entities: list[Entity], records: list) -> None:
+    game_map = engine.game_map
+    player = engine.player
+
+    for turn, changed, added, holdings, progress, newly_explored, first, new_messages in records:
+        for index, kind, record, state in added:
+            entity = savegame.ENTITY_KINDS[kind].__new__(savegame.ENTITY_KINDS[kind])
+            entity.__dict__.update(state)
+            entities.append(entity)
+            changed = [(index, record)] + changed
+
+        for index, (x, y, char, entity_color, name, blocks_movement, render_order, location, vitals) in changed:
+            entity = entities[index]
+            if entity in game_map.entities:
+                game_map.remove_entity(entity)
+            entity.x, entity.y = x, y
+            entity.char, entity.color, entity.name = char, entity_color, name
+            entity.blocks_movement, entity.render_order = blocks_movement, render_order
+            if vitals is not None:
+                entity.fighter._hp, entity.fighter._mp, entity.fighter._ep = vitals
+                if render_order == RenderOrder.CORPSE:
+                    entity.ai = None
+            match location:
+                case ("map",):
+                    entity.parent = game_map
+                    game_map.add_entity(entity)
+                case ("inventory", holder):
+                    entity.parent = entities[holder].inventory
+
+        for index, (items, slots, equipped) in holdings:
+            holder = entities[index]
+            holder.inventory.items = [entities[item] for item in items]
+            holder.inventory.slots = [entities[item] if item is not None else None for item in slots]
+            holder.equipment.items = {slot: entities[item] for slot, item in equipped}
+            holder.equipment.invalidate_bonuses()
+            for item in holder.inventory.items:
+                item.parent = holder.inventory
+
+        if progress is not None:
+            player.level.current_level, player.level.current_xp, stats = progress
+            player.fighter.stats.__dict__.update(stats)
+            player.fighter.stats._params = None
+
+        explored = np.frombuffer(newly_explored, dtype=np.uint32)
+        if explored.size:
+            game_map.explored[np.unravel_index(explored, game_map.explored.shape, order="F")] = True
+
+        if new_messages:
+            messages = []
+            for text, fg, count in new_messages:
+                message = Message(text, fg)
+                message.count = count
+                messages.append(message)
+            engine.message_log.replace_since(first, messages)
+
+        engine.turn = turn
+
+    game_map.on_tiles_changed()
+
+
+def recover(filename: str, journal_filename: str) -> Engine:
+    """Load the save and replay the journal written after it, if there is one."""
+    with open(filename, "rb") as f:
+        engine, entities = savegame.read(f)
+
+    try:
+        with open(journal_filename, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return engine
+    if not data.startswith(MAGIC) or not entities:
+        return engine
+    frames = _read_frames(data)
+    if not frames:
+        return engine
+
+    header = {"version": VERSION, "seed": engine.seed, "floor": engine.game_world.current_floor, "turn": engine.turn}
+    if frames[0] != header:
+        return engine  # The save was written after the journal, e.g. on exit.
+    _replay(engine, entities, frames[1:])
+    engine.update_fov()
+    return engine
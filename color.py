@@ -18,6 +18,7 @@ impossible = (0x80, 0x80, 0x80)
 error = (0xFF, 0x40, 0x40)
 
 welcome_text = (0x20, 0xA0, 0xFF)
+game_saved = (0x80, 0xC0, 0x80)
 health_recovered = (0x0, 0xFF, 0x0)
 
 bar_text = white
@@ -3,9 +3,9 @@ from __future__ import annotations
 import math
 from enum import IntFlag, IntEnum, Enum, auto
 from typing import Union, Optional
-import copy
 
 from ranged_value import Range
+import rng
 
 
 class DamageType(IntFlag):
@@ -39,9 +39,43 @@ class DefenseType(IntEnum):
     ABSOLUT = 1
 
 
+# Position of each damage type in the flat `Defense` values list, four ints per type:
+# percent min, percent max, absolute min, absolute max.
+_DAMAGE_TYPES = list(DamageType)
+_TYPE_OFFSET = {damage_type: index * 4 for index, damage_type in enumerate(_DAMAGE_TYPES)}
+
+
+def _roll(start: int, stop: int) -> int:
+    """Same as int(Range(start, stop)) without building the range."""
+    return start if start == stop else rng.combat.randint(start, stop)
+
+
+def _describe_range(start: int, stop: int) -> str:
+    return str(start) if start == stop else f"{start}-{stop}"
+
+
 class Defense:
+    __slots__ = ("values", "types", "order")
+
     def __init__(self, defense: dict[DamageType, tuple[Range, Range]] = None):
-        self.defense: dict[DamageType, tuple[Range, Range]] = defense or {}
+        self.values: list[int] = [0] * (len(_DAMAGE_TYPES) * 4)
+        # Damage types which have a defense entry, even a zero one, as a mask and in the order they were added.
+        self.types: int = 0
+        self.order: tuple[DamageType, ...] = ()
+        for key, (percent, absolute) in (defense or {}).items():
+            self._add_to(key, percent.start, percent.stop, absolute.start, absolute.stop)
+
+    def _add_to(self, key: DamageType, percent_start: int, percent_stop: int, absolute_start: int,
+                absolute_stop: int) -> None:
+        offset = _TYPE_OFFSET[key]
+        values = self.values
+        values[offset] += percent_start
+        values[offset + 1] += percent_stop
+        values[offset + 2] += absolute_start
+        values[offset + 3] += absolute_stop
+        if not self.types & key:
+            self.types |= key
+            self.order += (key,)
 
     def decrease(self, value: Union[Damage, Range, int], key: DamageType = DamageType.PHYSICAL) -> float:
         if isinstance(value, Damage):
@@ -50,38 +84,74 @@ class Defense:
         if key == DamageType.ABSOLUTE:
             return int(value)
         value = int(value)
-        defense = self.defense.get(key) or [0, 0]
-        return round(value * (100 - int(defense[DefenseType.PERCENT])) / 100 - int(defense[DefenseType.ABSOLUT]), 1)
+        percent = absolute = 0
+        if self.types & key:
+            offset = _TYPE_OFFSET[key]
+            values = self.values
+            percent = _roll(values[offset], values[offset + 1])
+            absolute = _roll(values[offset + 2], values[offset + 3])
+        return round(value * (100 - percent) / 100 - absolute, 1)
+
+    def copy(self) -> Defense:
+        defense = Defense.__new__(Defense)
+        defense.values = self.values.copy()
+        defense.types = self.types
+        defense.order = self.order
+        return defense
+
+    def _merge_order(self, other: Defense) -> tuple[DamageType, ...]:
+        return self.order + tuple(key for key in other.order if not self.types & key)
 
     def __add__(self, other: Union[Defense, tuple[Range, Range], Range, int]) -> Defense:
-        defense = copy.deepcopy(self)
+        if isinstance(other, Defense):
+            defense = Defense.__new__(Defense)
+            defense.values = [a + b for a, b in zip(self.values, other.values)]
+            defense.types = self.types | other.types
+            defense.order = self._merge_order(other)
+            return defense
+        return self.copy().__iadd__(other)
+
+    def __iadd__(self, other: Union[Defense, tuple[Range, Range], Range, int]) -> Defense:
         match other:
-            case Range() | int():
-                current = defense.defense.get(DamageType.DEFAULT) or [Range(), Range()]
-                current = current[DefenseType.PERCENT], current[DefenseType.ABSOLUT] + other
-                defense.defense[DamageType.DEFAULT] = current
+            case Range():
+                self._add_to(DamageType.DEFAULT, 0, 0, other.start, other.stop)
+            case int():
+                self._add_to(DamageType.DEFAULT, 0, 0, other, other)
             case (percent, absolute):
-                current = defense.defense.get(DamageType.DEFAULT) or [Range(), Range()]
-                current = current[DefenseType.PERCENT] + percent, current[DefenseType.ABSOLUT] + absolute
-                defense.defense[DamageType.DEFAULT] = current
-            case Defense(defense=values):
-                for key, value in values.items():
-                    current = defense.defense.get(key, None) or [Range(), Range()]
-                    current = current[0] + value[0], current[1] + value[1]
-                    defense.defense[key] = current
+                self._add_to(DamageType.DEFAULT, percent.start, percent.stop, absolute.start, absolute.stop)
+            case Defense():
+                self.values = [a + b for a, b in zip(self.values, other.values)]
+                self.order = self._merge_order(other)
+                self.types |= other.types
             case _:
-                print("lol", type(other))
-        return defense
-
-    def __iadd__(self, other):
-        self.defense = (self + other).defense
+                return NotImplemented
         return self
 
+    def __getstate__(self) -> tuple[list[int], int, tuple[DamageType, ...]]:
+        return self.values, self.types, self.order
+
+    def __setstate__(self, state: Union[tuple[list[int], int, tuple[DamageType, ...]], dict]) -> None:
+        if isinstance(state, dict):
+            # Saves from before the flat layout hold {"defense": {type: (percent, absolute)}}.
+            self.__init__({key: tuple(value) for key, value in state["defense"].items()})
+        else:
+            self.values, self.types, self.order = state
+
     def __bool__(self):
-        return bool(self.defense)
+        return bool(self.types)
 
-    def __getitem__(self, item):
-        return self.defense[item]
+    def __getitem__(self, item: DamageType) -> tuple[Range, Range]:
+        if not self.types & item:
+            raise KeyError(item)
+        offset = _TYPE_OFFSET[item]
+        values = self.values
+        return Range(values[offset], values[offset + 1]), Range(values[offset + 2], values[offset + 3])
 
     def describe(self) -> list[str]:
-        return [f"{key.name.title()}: {value[0]}%, {value[1]}" for key, value in self.defense.items()]
+        lines = []
+        for key in self.order:
+            offset = _TYPE_OFFSET[key]
+            percent = _describe_range(self.values[offset], self.values[offset + 1])
+            absolute = _describe_range(self.values[offset + 2], self.values[offset + 3])
+            lines.append(f"{key.name.title()}: {percent}%, {absolute}")
+        return lines
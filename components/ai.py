@@ -1,11 +1,10 @@
 from __future__ import annotations
 
-import random
 from typing import TYPE_CHECKING, Optional
-import numpy as np  # type: ignore
 import tcod
 
 from actions import Action, MeleeAction, MovementAction, WaitAction, DirectedActionDispatcher
+import rng
 
 if TYPE_CHECKING:
     from entity import Actor
@@ -15,34 +14,15 @@ class BaseAI(Action):
     def perform(self) -> None:
         raise NotImplementedError()
 
-    def get_path_to(self, dest_x: int, dest_y: int) -> list[tuple[int, int]]:
-        """Compute and return a path to the targetType position.
+    def get_path_to_player(self) -> list[tuple[int, int]]:
+        """Return a path to the player, descending the distance map shared by all actors during a turn.
 
         If there is no valid path then returns an empty list.
         """
-        # Copy the walkable array.
-        cost = np.array(self.entity.parent.tiles["walkable"], dtype=np.int8)
-
-        for entity in self.entity.parent.entities:
-            # Check that an entity blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways.  A higher number means enemies will take longer paths in
-                # order to surround the player.
-                cost[entity.x, entity.y] += 10
-
-        # Create a graph from the cost array and pass that graph to a new pathfinder.
-        graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
-        pathfinder = tcod.path.Pathfinder(graph)
-
-        pathfinder.add_root((self.entity.x, self.entity.y))  # Start position.
-
-        # Compute the path to the destination and remove the starting point.
-        path: list[list[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
-
-        # Convert from List[List[int]] to List[Tuple[int, int]].
-        return [(index[0], index[1]) for index in path]
+        path = tcod.path.hillclimb2d(self.engine.player_distance, (self.entity.x, self.entity.y), True, True)
+        if tuple(path[-1]) != self.engine.player.position:
+            return []
+        return [(index[0], index[1]) for index in path[1:].tolist()]
 
     @staticmethod
     def action_name():
@@ -72,7 +52,7 @@ class ConfusedEnemy(BaseAI):
             self.entity.ai = self.previous_ai
         else:
             # Pick a random direction
-            direction_x, direction_y = random.choice(
+            direction_x, direction_y = rng.ai.choice(
                 [
                     (-1, -1),  # Northwest
                     (0, -1),  # North
@@ -111,7 +91,7 @@ class HostileEnemy(BaseAI):
             if distance <= 1:
                 return MeleeAction(self.entity, dx, dy).perform()
 
-            self.path = self.get_path_to(target.x, target.y)
+            self.path = self.get_path_to_player()
 
         if self.path:
             dest_x, dest_y = self.path.pop(0)
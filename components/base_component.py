@@ -23,4 +23,5 @@ class BaseComponent:
         return self.game_map.engine
 
     def copy(self: T) -> T:
+        """Return a copy for a new owner. Deep by default, components built by factories copy only mutable state."""
         return copy.deepcopy(self)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import random
+import copy
 from typing import Optional, TYPE_CHECKING
 from operator import attrgetter
 from itertools import chain
@@ -15,6 +15,7 @@ from exceptions import Impossible
 from input_handlers import SingleRangedAttackHandler, AreaRangedAttackHandler, ActionOrHandler
 from components_types import ConsumableTarget, ConsumableType
 from ranged_value import Range
+import rng
 
 if TYPE_CHECKING:
     from entity import Actor, Item
@@ -35,6 +36,15 @@ class Consumable(BaseComponent):
         self._range = range
         self._radius = radius
 
+    def copy(self) -> Consumable:
+        """Return an unattached copy with its own effect."""
+        clone = copy.copy(self)
+        clone._targets = None
+        if self.effect is not None:
+            clone.effect = self.effect.copy
+            clone.effect.parent = clone
+        return clone
+
     @property
     def range(self) -> int:
         return self._range
@@ -107,7 +117,7 @@ class Consumable(BaseComponent):
                 if distance < self.range:
                     targets.append(actor)
 
-        return random.choices(targets) if targets else []
+        return rng.combat.choices(targets) if targets else []
 
     def _get_selected_target(self, consumer: Actor, xy: tuple[int, int]) -> list[Actor]:
         if not self.engine.game_map.visible[xy]:
@@ -124,9 +134,8 @@ class Consumable(BaseComponent):
 
     def activate(self, action: actions.ItemAction) -> None:
         was = False
-        for target in self._targets:
-            if self.effect is not None:
-                was |= self.effect.apply(target, True)
+        if self.effect is not None:
+            was = self.effect.apply_all(self._targets, True)
         if was:
             self.consume()
         else:
@@ -172,6 +181,9 @@ class Combine(Consumable):
         for consume in self.consumables:
             consume.parent = value
 
+    def copy(self) -> Combine:
+        return Combine([consume.copy() for consume in self.consumables], self.consumeType)
+
     def activate(self, action: actions.ItemAction) -> None:
         was = False
         for consume in self.consumables:
@@ -214,6 +226,11 @@ class MagicBook(Consumable):
 
         self._consumer: Optional[Actor] = None
 
+    def copy(self) -> MagicBook:
+        clone = super().copy()
+        clone._consumer = None
+        return clone
+
     def description(self) -> list[str]:
         data = [f"Mana usage: {self.mp}"]
         data.extend(self.effect.describe())
@@ -19,12 +19,22 @@ class Effect:
     def apply(self, actor: Actor, consume: bool) -> bool:
         raise NotImplementedError
 
+    def apply_all(self, actors: list[Actor], consume: bool) -> bool:
+        """Apply to every actor in turn, return True if any of them was affected."""
+        was = False
+        for actor in actors:
+            was |= self.apply(actor, consume)
+        return was
+
     def describe(self) -> list[str]:
         raise NotImplementedError
 
     @property
     def copy(self) -> Effect:
-        return copy.deepcopy(self)
+        """Unparented copy, effects holding other effects copy them too."""
+        clone = copy.copy(self)
+        clone.__dict__.pop("parent", None)
+        return clone
 
 
 class HealEffect(Effect):
@@ -70,8 +80,22 @@ class DamageEffect(Effect):
         self.damage = damage
 
     def apply(self, actor: Actor, consume: bool) -> bool:
+        return self.strike(actor, int(self.damage.value))
+
+    def apply_all(self, actors: list[Actor], consume: bool) -> bool:
+        was = False
+        for actor, value in zip(actors, self.roll(len(actors))):
+            was |= self.strike(actor, value)
+        return was
+
+    def roll(self, count: int) -> list[int]:
+        """Roll the damage of `count` targets at once."""
+        return self.damage.value.sample(count)
+
+    def strike(self, actor: Actor, value: int) -> bool:
+        """Deal an already rolled damage `value` to `actor`, before its defense."""
         engine = actor.parent.engine
-        value = self.damage.attack(actor.fighter.defense)
+        value = actor.fighter.defense.decrease(value, self.damage.type)
         if value <= 0:
             engine.message_log.add_message(
                 f"No damage for {actor.name}"
@@ -130,12 +154,28 @@ class Combine(Effect):
         for effect in self.effects:
             effect.parent = value
 
+    @property
+    def copy(self) -> Combine:
+        return Combine([effect.copy for effect in self.effects])
+
     def apply(self, actor: Actor, consume: bool) -> bool:
         was = False
         for effect in self.effects:
             was |= effect.apply(actor, True)
         return was
 
+    def apply_all(self, actors: list[Actor], consume: bool) -> bool:
+        # Every actor gets all the effects in turn, as with `apply`, the damage is rolled for all of them at once.
+        rolls = {id(effect): effect.roll(len(actors)) for effect in self.effects if isinstance(effect, DamageEffect)}
+        was = False
+        for index, actor in enumerate(actors):
+            for effect in self.effects:
+                if isinstance(effect, DamageEffect):
+                    was |= effect.strike(actor, rolls[id(effect)][index])
+                else:
+                    was |= effect.apply(actor, True)
+        return was
+
     def describe(self) -> list[str]:
         return list(chain.from_iterable(effect.describe() for effect in self.effects))
 
@@ -155,6 +195,10 @@ class DurableEffect(Effect):
         self._parent = value
         self.effect.parent = value
 
+    @property
+    def copy(self) -> DurableEffect:
+        return DurableEffect(self.turns, self.effect.copy)
+
     def describe(self) -> list[str]:
         return [
             f"Turns: {self.turns if self.turns > 0 else 'permanent'}",
@@ -180,6 +224,10 @@ class AddEffect(Effect):
     def __init__(self, effect: Effect):
         self.effect = effect
 
+    @property
+    def copy(self) -> AddEffect:
+        return AddEffect(self.effect.copy)
+
     def apply(self, actor: Actor, consume: bool) -> bool:
         engine = actor.parent.engine
         if actor.is_alive:
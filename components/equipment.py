@@ -16,24 +16,46 @@ class Equipment(BaseComponent):
 
     def __init__(self, items: Optional[dict[EquipmentType, Item]] = None):
         self.items: dict[EquipmentType, Item] = items or {}
+        # Aggregated bonuses of equipped items, dropped by `invalidate_bonuses`.
+        self._defense_bonus: Optional[Defense] = None
+        self._power_bonus: Optional[Range] = None
+
+    def __getstate__(self) -> dict:
+        # The bonuses aren't saved, they are aggregated again after loading.
+        state = self.__dict__.copy()
+        del state["_defense_bonus"], state["_power_bonus"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.invalidate_bonuses()
+
+    def invalidate_bonuses(self) -> None:
+        """Must be called when the equipped items or their bonuses change."""
+        self._defense_bonus = None
+        self._power_bonus = None
 
     @property
     def defense_bonus(self) -> Defense:
-        bonus = Defense()
-        for item in self.items.values():
-            if item.equippable is not None:
-                bonus += item.equippable.defense_bonus
+        if self._defense_bonus is None:
+            bonus = Defense()
+            for item in self.items.values():
+                if item.equippable is not None:
+                    bonus += item.equippable.defense_bonus
+            self._defense_bonus = bonus
 
-        return bonus
+        return self._defense_bonus
 
     @property
     def power_bonus(self) -> Range:
-        bonus = Range(0)
-        for item in self.items.values():
-            if item.equippable is not None:
-                bonus += item.equippable.power_bonus
+        if self._power_bonus is None:
+            bonus = Range(0)
+            for item in self.items.values():
+                if item.equippable is not None:
+                    bonus += item.equippable.power_bonus
+            self._power_bonus = bonus
 
-        return bonus
+        return self._power_bonus
 
     def item_is_equipped(self, item: Item) -> bool:
         return item in self.items.values()
@@ -51,6 +73,7 @@ class Equipment(BaseComponent):
             self.unequip_from_slot(slot, add_message)
 
         self.items[slot] = item
+        self.invalidate_bonuses()
         if add_message:
             self.equip_message(item.name)
 
@@ -60,6 +83,7 @@ class Equipment(BaseComponent):
         if current_item is not None and add_message:
             self.unequip_message(current_item.name)
         del self.items[slot]
+        self.invalidate_bonuses()
 
     def toggle_equip(self, item: Item, add_message: bool = True) -> None:
         if not item.equippable:
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import copy
 from typing import TYPE_CHECKING, Any, Union
 
 from components.base_component import BaseComponent
+from components.inventory import Inventory
 from components_types import EquipmentType
 from ranged_value import Range
 from combat import Damage, DamageType, Defense, DefenseType
@@ -30,6 +32,23 @@ class Equippable(BaseComponent):
         else:
             self.defense_bonus: Defense = Defense({DamageType.DEFAULT: (Range(), defense_bonus or Range())})
 
+    def copy(self) -> Equippable:
+        """Return an unattached copy, only the defense bonus is mutable."""
+        clone = copy.copy(self)
+        clone.defense_bonus = self.defense_bonus.copy()
+        return clone
+
+    def add_bonus(self, power_bonus: Union[Range, int] = None, defense_bonus: Union[Defense, Range, int] = None) -> None:
+        """Improve this item's bonuses, refreshing the owner's equipment if the item is equipped."""
+        if power_bonus is not None:
+            self.power_bonus += power_bonus
+        if defense_bonus is not None:
+            self.defense_bonus += defense_bonus
+
+        inventory = getattr(self.parent, "parent", None)  # Items being constructed have no parent yet.
+        if isinstance(inventory, Inventory) and inventory.parent.equipment.item_is_equipped(self.parent):
+            inventory.parent.equipment.invalidate_bonuses()
+
     def bonuses(self) -> list[tuple[str, Any]]:
         return [(name, getattr(self, f"{name}_bonus")) for name in self._bonuses]
 
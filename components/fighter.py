@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import copy
 import math
 from typing import TYPE_CHECKING, Union
 
@@ -31,6 +32,13 @@ class Fighter(BaseComponent):
         self.mana_decrease_turn = 0
         self.energy_decrease_turn = 0
 
+    def copy(self) -> Fighter:
+        """Return an unattached copy with its own stats and defense, ranges are immutable and shared."""
+        clone = copy.copy(self)
+        clone.stats = copy.copy(self.stats)
+        clone.fixed_defense = self.fixed_defense.copy()
+        return clone
+
     @property
     def max_hp(self) -> int:
         return self.stats.params.max_hp
@@ -60,6 +68,7 @@ class Fighter(BaseComponent):
         if value < self._hp:
             self.hp_decrease_turn = self.engine.turn
         self._hp = max(0., min(value, self.max_hp))
+        self._vitals_changed()
         if self._hp == 0 and self.parent.ai:
             self.die()
 
@@ -93,6 +102,7 @@ class Fighter(BaseComponent):
         if self._mp >= value:
             self._mp -= value
             self.mana_decrease_turn = self.engine.turn
+            self._vitals_changed()
             return value
         return 0
 
@@ -105,17 +115,26 @@ class Fighter(BaseComponent):
         if value < self._ep:
             self.energy_decrease_turn = self.engine.turn
         self._ep = max(0., min(value, self.max_ep))
+        self._vitals_changed()
 
     def restore_energy(self, value) -> float:
         before = self._ep
         self._ep = max(0., min(before + value, self.max_ep))
+        self._vitals_changed()
         return self._ep - before
 
     def restore_mana(self, value: float) -> float:
         before = self._mp
         self._mp = max(0., min(before + value, self.max_mp))
+        self._vitals_changed()
         return self._mp - before
 
+    def _vitals_changed(self) -> None:
+        # Actors lie on a map, which tells the autosave what changed.
+        game_map = getattr(self.parent, "parent", None)
+        if game_map is not None:
+            game_map.mark_changed(self.parent)
+
     def die(self) -> None:
         if self.engine.player is self.parent:
             death_message = "You died!"
@@ -131,6 +150,7 @@ class Fighter(BaseComponent):
         self.parent.ai = None
         self.parent.render_order = RenderOrder.CORPSE
         self.parent.name = f"remains of {self.parent.name}"
+        self.game_map.on_actor_death(self.parent)
 
         self.engine.message_log.add_message(death_message, death_message_color)
 
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Union
+from typing import TYPE_CHECKING, Mapping, Union
 import random
 
 from components.base_component import BaseComponent
@@ -58,3 +58,15 @@ class Level(BaseComponent):
         self.parent.fighter.stats.remains += -1
         if log:
             self.engine.message_log.add_message(f"Your {stat_name} improves!")
+
+    def increase_stats(self, increments: Mapping[str, int], log: bool = True) -> None:
+        """Spend points on several stats in one step, `increments` maps stat names to points."""
+        stats = self.parent.fighter.stats
+        stats.increase_stats(increments)
+        total = sum(increments.values())
+        stats.used += total
+        stats.remains -= total
+        if log:
+            for stat_name, amount in increments.items():
+                if amount:
+                    self.engine.message_log.add_message(f"Your {stat_name} improves by {amount}!")
@@ -1,10 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Mapping, Optional
 
 from ranged_value import Range
 from combat import Defense, DamageType
 
 
-@dataclass
+@dataclass(frozen=True)
 class FighterParams:
     power: Range
     defense: Defense
@@ -49,8 +50,26 @@ class ActorStats:
 
     base_stats_names = ["strength", "dexterity", "constitution", "intelligence", "concentration", "vitality"]
 
+    # Derived params are cached, `increase_stat` drops the cache.
+    _params: Optional[FighterParams] = field(default=None, init=False, repr=False, compare=False)
+
+    def __getstate__(self) -> dict:
+        # The cache isn't saved, it is derived again after loading.
+        state = self.__dict__.copy()
+        state.pop("_params", None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._params = None
+
     @property
     def params(self) -> FighterParams:
+        if self._params is None:
+            self._params = self._compute_params()
+        return self._params
+
+    def _compute_params(self) -> FighterParams:
         return FighterParams(
             power=Range(self.strength, int(self.strength * 1.1)),
             defense=Defense(
@@ -74,6 +93,14 @@ class ActorStats:
         if stat not in self.base_stats_names:
             return
         setattr(self, stat, getattr(self, stat) + 1)
+        self._params = None
+
+    def increase_stats(self, increments: Mapping[str, int]):
+        """Add several points to several stats at once, params are derived again only once."""
+        for stat, amount in increments.items():
+            if amount and stat in self.base_stats_names:
+                setattr(self, stat, getattr(self, stat) + amount)
+        self._params = None
 
     def get_stat(self, stat):
         return getattr(self, stat)
@@ -14,6 +14,8 @@ class MapConfig:
     room_max_size: int = 10
     room_min_size: int = 6
     max_rooms: int = 30
+    # Share of a room's free floor that its monsters and items can fill at most.
+    entity_density: float = 0.5
 
 
 class Config:
@@ -63,6 +65,19 @@ class Config:
     fov_radius = 8
     torch_radius = 6
     save_name = "savegame.sav"
+    # "zlib" saves fast, "lzma" makes smaller files, "none" doesn't compress.
+    save_compressor = "zlib"
+    # write a full save on every new floor and journal what changes every turn, see `autosave`
+    autosave = True
+    save_journal = "savegame.journal"
+    # generate the next floor in a worker process while the current one is played
+    prefetch_floors = True
+    # left floors kept in memory, older ones are spilled to a temporary file, see `GameWorld`
+    floor_cache_size = 2
+    floor_compressor = "zlib"
+    # messages kept in memory, older ones are moved to a temporary file a block at a time, see `MessageLog`
+    message_log_size = 256
+    message_block_size = 128
 
     @classmethod
     def to_dict(cls) -> dict:
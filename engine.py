@@ -1,8 +1,7 @@
 from __future__ import annotations
 
-import lzma
-import pickle
-from typing import TYPE_CHECKING
+import random
+from typing import Optional, TYPE_CHECKING
 
 from tcod.console import Console
 
@@ -11,8 +10,11 @@ from config import Config
 import exceptions
 from message_log import MessageLog
 import render_utils
+import rng
 
 if TYPE_CHECKING:
+    import numpy as np  # type: ignore
+
     from entity import Actor
     from game_map import GameMap, GameWorld
 
@@ -21,20 +23,38 @@ class Engine:
     game_map: GameMap
     game_world: GameWorld
 
-    def __init__(self, player: Actor):
+    def __init__(self, player: Actor, seed: Optional[int] = None):
         self.message_log = MessageLog()
         self.mouse_location = (0, 0)
         self.player = player
         self.turn = 0
+        self._player_distance: Optional[np.ndarray] = None
+        self.rng = rng.RandomStreams(seed if seed is not None else random.getrandbits(32))
+        rng.use(self.rng)
+
+    @property
+    def seed(self) -> int:
+        return self.rng.seed
+
+    @property
+    def player_distance(self) -> np.ndarray:
+        """Distance map rooted at the player, built once per enemy turn and shared by all monsters."""
+        if self._player_distance is None:
+            self._player_distance = self.game_map.get_distance_map(*self.player.position)
+        return self._player_distance
 
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}:
+        # Copy the actors, they can die and leave the set during the loop.
+        for entity in tuple(self.game_map.actors):
+            if entity is self.player:
+                continue
             entity.apply_effects()
             if entity.ai:
                 try:
                     entity.ai.perform()
                 except exceptions.Impossible:
                     pass
+        self._player_distance = None
         self.turn += 1
 
     def update_fov(self) -> None:
@@ -120,6 +140,6 @@ class Engine:
 
     def save_as(self, filename: str) -> None:
         """Save this Engine instance as a compressed file."""
-        save_data = lzma.compress(pickle.dumps(self))
-        with open(filename, "wb") as f:
-            f.write(save_data)
+        import savegame
+
+        savegame.save(self, filename, Config.save_compressor)
@@ -2,66 +2,67 @@ from __future__ import annotations
 
 import math
 from typing import TYPE_CHECKING
-import random
 
 from components.fighter import Fighter
 from components.params import ActorStats
 from entities.factory import EnemyFactory
 from ranged_value import Range
+import rng
 
 if TYPE_CHECKING:
     from entity import Actor
 
+# Every level up improves one of three stat groups, picked by (level + shift) % 3 with a random shift of -1, 0 or 1.
+# The shift makes the three groups equally likely at any level, so the group sizes of all level ups of a floor
+# are drawn at once, straight from the loot stream.
+GROUPS = range(3)
+
+
+def _level_ups(first_level: int, floor: int) -> int:
+    return max(0, floor + math.ceil(floor / 10) - first_level)
+
+
+def _group_sizes(level_ups: int) -> tuple[int, int, int]:
+    """Return how many of `level_ups` went to the constitution, concentration and strength groups."""
+    groups = rng.loot.choices(GROUPS, k=level_ups)
+    return groups.count(0), groups.count(1), groups.count(2)
+
+
+def _halves(count: int) -> int:
+    """Return how many of `count` coin flips came up heads."""
+    return rng.loot.getrandbits(count).bit_count() if count else 0
+
 
 def orc_level_up(enemy: Actor, floor: int, _):
-    for level in range(3, floor + math.ceil(floor / 10)):
-        match (level + random.randint(-1, 1)) % 3:
-            case 0:
-                enemy.level.increase_stat("constitution", log=False)
-            case 1:
-                enemy.level.increase_stat("concentration", log=False)
-                if random.random() < 1 / 2:
-                    enemy.level.increase_stat("constitution", log=False)
-            case 2:
-                enemy.level.increase_stat("strength", log=False)
+    constitution, concentration, strength = _group_sizes(_level_ups(3, floor))
+    # Half of the concentration level ups also improve constitution.
+    extra = _halves(concentration)
+    enemy.level.increase_stats(
+        {"constitution": constitution + extra, "concentration": concentration, "strength": strength}, log=False
+    )
 
 
 def goblin_level_up(enemy: Actor, floor: int, _):
-    for level in range(3, floor + math.ceil(floor / 10)):
-        match (level + random.randint(-1, 1)) % 3:
-            case 0:
-                enemy.level.increase_stat("constitution", log=False)
-            case 1:
-                enemy.level.increase_stat("concentration", log=False)
-                if random.random() < 1 / 2:
-                    enemy.level.increase_stat("constitution", log=False)
-            case 2:
-                enemy.level.increase_stat("strength", log=False)
-                enemy.level.increase_stat("strength", log=False)
+    constitution, concentration, strength = _group_sizes(_level_ups(3, floor))
+    extra = _halves(concentration)
+    enemy.level.increase_stats(
+        {"constitution": constitution + extra, "concentration": concentration, "strength": 2 * strength}, log=False
+    )
 
 
 def troll_level_up(enemy: Actor, floor: int, _):
-    for level in range(4, floor + math.ceil(floor / 10)):
-        match (level + random.randint(-1, 1)) % 3:
-            case 0:
-                enemy.level.increase_stat("constitution", log=False)
-            case 1:
-                if random.random() < 1 / 2:
-                    enemy.level.increase_stat("concentration", log=False)
-                    enemy.level.increase_stat("concentration", log=False)
-                    enemy.level.increase_stat("constitution", log=False)
-                else:
-                    enemy.level.increase_stat("concentration", log=False)
-                    enemy.level.increase_stat("constitution", log=False)
-
-            case 2:
-                if random.random() < 1 / 2:
-                    enemy.level.increase_stat("strength", log=False)
-                    enemy.level.increase_stat("strength", log=False)
-                    enemy.level.increase_stat("strength", log=False)
-                else:
-                    enemy.level.increase_stat("strength", log=False)
-                    enemy.level.increase_stat("strength", log=False)
+    constitution, concentration, strength = _group_sizes(_level_ups(4, floor))
+    # Half of the concentration level ups give two points instead of one, the same for three strength points.
+    extra_concentration = _halves(concentration)
+    extra_strength = _halves(strength)
+    enemy.level.increase_stats(
+        {
+            "constitution": constitution + concentration,
+            "concentration": concentration + extra_concentration,
+            "strength": 2 * strength + extra_strength,
+        },
+        log=False,
+    )
 
 
 orc = EnemyFactory(
@@ -1,20 +1,19 @@
-import random
-
 from combat import Defense, DamageType
 from components import equippable
 from components_types import EquipmentType
 from entities.factory import ItemFactory
 from ranged_value import Range
+import rng
 
 
 def sword_level_up(item, floor, base):
     limit = (floor - base)
-    item.equippable.power_bonus += random.randint(1, limit)
+    item.equippable.add_bonus(power_bonus=rng.loot.randint(1, limit))
 
 
 def def_level_up(item, floor, base):
-    limit = (floor - base) // 3
-    item.equippable.defense_bonus += random.randint(1, limit)
+    limit = max(1, (floor - base) // 3)
+    item.equippable.add_bonus(defense_bonus=rng.loot.randint(1, limit))
 
 
 dagger = ItemFactory(
@@ -54,7 +54,7 @@ class Entity:
         if parent:
             # If parent isn't provided now then it will be set later.
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
         self.dungeon_level = dungeon_level
 
     @property
@@ -63,8 +63,11 @@ class Entity:
 
     def move(self, dx: int, dy: int) -> None:
         # Move the entity by a given amount
+        old_x, old_y = self.x, self.y
         self.x += dx
         self.y += dy
+        if self.parent is self.game_map:
+            self.game_map.move_entity(self, old_x, old_y)
 
     def distance(self, x: int, y: int) -> float:
         """
@@ -82,19 +85,25 @@ class Entity:
         clone.x = x
         clone.y = y
         clone.parent = game_map
-        game_map.entities.add(clone)
+        game_map.add_entity(clone)
         return clone
 
     def place(self, x: int, y: int, game_map: Optional[GameMap] = None) -> None:
         """Place this entity at a new location.  Handles moving across GameMaps."""
-        self.x = x
-        self.y = y
+        old_x, old_y = self.x, self.y
         if game_map:
             if hasattr(self, "parent"):  # Possibly uninitialized.
                 if self.parent is self.game_map:
-                    self.game_map.entities.remove(self)
+                    self.game_map.remove_entity(self)
+            self.x = x
+            self.y = y
             self.parent = game_map
-            game_map.entities.add(self)
+            game_map.add_entity(self)
+        else:
+            self.x = x
+            self.y = y
+            if hasattr(self, "parent") and self.parent is self.game_map:
+                self.game_map.move_entity(self, old_x, old_y)
 
     def copy(self: T) -> T:
         return copy.deepcopy(self)
@@ -231,6 +240,19 @@ class Item(Entity):
         if self.equippable:
             self.equippable.parent = self
 
+    def copy(self) -> Item:
+        """Return an unplaced copy built from copies of the components instead of a deep copy."""
+        return Item(
+            x=self.x,
+            y=self.y,
+            char=self.char,
+            color=self.color,
+            name=self.name,
+            consumable=self.consumable.copy() if self.consumable is not None else None,
+            equippable=self.equippable.copy() if self.equippable is not None else None,
+            dungeon_level=self.dungeon_level,
+        )
+
     def description(self) -> list[str]:
         messages = [
             f"Name: {self.name}",
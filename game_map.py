@@ -1,10 +1,18 @@
 from __future__ import annotations
 
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING
+import atexit
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain
+import multiprocessing
+import tempfile
+from typing import AbstractSet, BinaryIO, Iterable, Iterator, Optional, TYPE_CHECKING
 
 import numpy as np  # type: ignore
 from tcod.console import Console
 from tcod.map import compute_fov
+import tcod.path
 
 import color
 from config import Config, MapConfig
@@ -17,34 +25,157 @@ if TYPE_CHECKING:
 
 
 class GameMap:
+    # Maps saved before floors could be revisited have no up stairs.
+    upstairs_location: Optional[tuple[int, int]] = None
+
     def __init__(
-            self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()
+            self, engine: Optional[Engine], width: int, height: int, entities: Iterable[Entity] = ()
     ):
         self.engine = engine
         self.width, self.height = width, height
-        self.entities = set(entities)
+        # Entities and the buckets below are insertion ordered dicts, not sets: sets iterate in memory address
+        # order, which would make turn order and random targets differ between runs of the same seed.
+        self.entities: dict[Entity, None] = {}
         self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
 
+        # Position index over `entities`, kept in sync by `add_entity`, `remove_entity` and `move_entity`.
+        self.entities_at: dict[tuple[int, int], list[Entity]] = {}
+        self.blocked = np.full((width, height), fill_value=False, order="F")
+        # Pathfinding costs from `tiles` and `blocked`, built on first use and kept in sync with `blocked`.
+        self._path_cost: Optional[np.ndarray] = None
+        # Entities split by kind, so the hot iterators don't need to filter `entities`.
+        self._actors: dict[Actor, None] = {}
+        self._corpses: dict[Actor, None] = {}
+        self._items: dict[Item, None] = {}
+        self._torches: dict[Torch, None] = {}
+        # Cached torch lighting: per torch (window, light mask) and the OR of masks of torches on explored cells.
+        # Torches and walls don't move, so it is only touched when a torch is added/removed or tiles change.
+        self._torch_light: dict[Torch, tuple[tuple[slice, slice], np.ndarray]] = {}
+        self._unlit_torches: dict[Torch, None] = {}
+        self._lightmap: Optional[np.ndarray] = None
+        # Entities added, removed, moved or otherwise changed since `pop_changed`, None while nobody asks.
+        self._changed: Optional[dict[Entity, None]] = None
+        for entity in entities:
+            self.add_entity(entity)
+
         self.visible = np.full((width, height), fill_value=False, order="F")
         self.explored = np.full((width, height), fill_value=False, order="F")
 
-        self.tiles_rgb = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
-            default=tile_types.DARKNESS
-        )
+        # Nothing is visible or explored yet, so every tile is drawn as darkness.
+        self.tiles_rgb = np.full((width, height), fill_value=tile_types.DARKNESS, order="F")
+        # Bounding box (x1, y1, x2, y2) of `tiles_rgb` which is out of date, None when nothing changed.
+        self._dirty: Optional[tuple[int, int, int, int]] = None
 
         self.downstairs_location = (0, 0)
+        self.upstairs_location = None
+        self.player_start = (0, 0)
 
         self.block_top = 0
         self.block_left = 0
 
+    def track_changes(self) -> None:
+        """Start collecting the entities which change, see `pop_changed`."""
+        self._changed = {}
+
+    def mark_changed(self, entity: Entity) -> None:
+        """Note that the state of `entity` changed, when changes are tracked."""
+        if self._changed is not None:
+            self._changed[entity] = None
+
+    def pop_changed(self) -> list[Entity]:
+        """Return the entities which changed since the last call, in the order they first changed."""
+        changed = list(self._changed)
+        self._changed.clear()
+        return changed
+
+    def add_entity(self, entity: Entity) -> None:
+        self.entities[entity] = None
+        self.mark_changed(entity)
+        self._index_add(entity)
+        bucket = self._bucket_of(entity)
+        if bucket is not None:
+            bucket[entity] = None
+        if isinstance(entity, Torch):
+            self._unlit_torches[entity] = None
+
+    def remove_entity(self, entity: Entity) -> None:
+        del self.entities[entity]
+        self.mark_changed(entity)
+        self._index_remove(entity, entity.x, entity.y)
+        bucket = self._bucket_of(entity)
+        if bucket is not None:
+            bucket.pop(entity, None)
+        if isinstance(entity, Torch):
+            self._unlit_torches.pop(entity, None)
+            if self._torch_light.pop(entity, None) is not None and self._lightmap is not None:
+                self._lightmap[:] = False
+                for torch, (window, light) in self._torch_light.items():
+                    if torch not in self._unlit_torches:
+                        self._lightmap[window] |= light
+
+    def on_actor_death(self, actor: Actor) -> None:
+        """Move a just killed actor to the corpses, it doesn't block its cell anymore."""
+        self._actors.pop(actor, None)
+        self._corpses[actor] = None
+        self.mark_changed(actor)
+        self.update_blocked(actor.x, actor.y)
+
+    def move_entity(self, entity: Entity, old_x: int, old_y: int) -> None:
+        """Update the position index after `entity` was moved from (old_x, old_y)."""
+        self.mark_changed(entity)
+        self._index_remove(entity, old_x, old_y)
+        self._index_add(entity)
+
+    def update_blocked(self, x: int, y: int) -> None:
+        """Recompute the blocking flag of a cell, e.g. after an entity stops blocking movement."""
+        self._set_blocked(x, y, any(entity.blocks_movement for entity in self.entities_at.get((x, y), ())))
+
+    def _set_blocked(self, x: int, y: int, value: bool) -> None:
+        self.blocked[x, y] = value
+        if self._path_cost is not None and self.tiles["walkable"][x, y]:
+            self._path_cost[x, y] = 11 if value else 1
+
+    def _bucket_of(self, entity: Entity) -> Optional[dict]:
+        if isinstance(entity, Actor):
+            return self._actors if entity.is_alive else self._corpses
+        if isinstance(entity, Item):
+            return self._items
+        if isinstance(entity, Torch):
+            return self._torches
+        return None
+
+    def _index_add(self, entity: Entity) -> None:
+        self.entities_at.setdefault(entity.position, []).append(entity)
+        if entity.blocks_movement:
+            self._set_blocked(entity.x, entity.y, True)
+
+    def _index_remove(self, entity: Entity, x: int, y: int) -> None:
+        cell = self.entities_at[x, y]
+        cell.remove(entity)
+        if not cell:
+            del self.entities_at[x, y]
+        if entity.blocks_movement:
+            self.update_blocked(x, y)
+
+    def mark_dirty(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        """Mark the [x1, x2) x [y1, y2) window of `tiles_rgb` for recomposition."""
+        if self._dirty is not None:
+            d_x1, d_y1, d_x2, d_y2 = self._dirty
+            x1, y1, x2, y2 = min(x1, d_x1), min(y1, d_y1), max(x2, d_x2), max(y2, d_y2)
+        self._dirty = x1, y1, x2, y2
+
     def update_tiles_rgb(self):
-        self.tiles_rgb = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
+        """Recompose only the dirty window of `tiles_rgb`."""
+        if self._dirty is None:
+            return
+        x1, y1, x2, y2 = self._dirty
+        window = slice(x1, x2), slice(y1, y2)
+        self.tiles_rgb[window] = np.select(
+            condlist=[self.visible[window], self.explored[window]],
+            choicelist=[self.tiles["light"][window], self.tiles["dark"][window]],
             default=tile_types.DARKNESS
         )
+        self._dirty = None
 
     def in_bounds(self, x: int, y: int) -> bool:
         """Return True if x and y are inside of the bounds of this map."""
@@ -74,36 +205,63 @@ class GameMap:
         return self
 
     @property
-    def actors(self) -> Iterator[Actor]:
-        """Iterate over this map's living actors."""
-        yield from (
-            entity
-            for entity in self.entities
-            if isinstance(entity, Actor) and entity.is_alive
-        )
+    def actors(self) -> AbstractSet[Actor]:
+        """This map's living actors."""
+        return self._actors.keys()
+
+    @property
+    def corpses(self) -> AbstractSet[Actor]:
+        return self._corpses.keys()
 
     @property
-    def items(self) -> Iterator[Item]:
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+    def items(self) -> AbstractSet[Item]:
+        return self._items.keys()
+
+    @property
+    def torches(self) -> AbstractSet[Torch]:
+        return self._torches.keys()
 
     def get_entities_at_location(self, loc_x: int, loc_y: int) -> Iterator[Entity]:
-        for entity in self.entities:
-            if entity.x == loc_x and entity.y == loc_y:
-                yield entity
+        # Iterate over a copy, so callers may remove the entity they are looking at.
+        yield from tuple(self.entities_at.get((loc_x, loc_y), ()))
 
     def get_blocking_entity_at_location(self, location_x: int, location_y: int) -> Optional[Entity]:
-        for entity in self.entities:
-            if entity.blocks_movement and entity.x == location_x and entity.y == location_y:
+        if not self.in_bounds(location_x, location_y) or not self.blocked[location_x, location_y]:
+            return None
+        for entity in self.entities_at[location_x, location_y]:
+            if entity.blocks_movement:
                 return entity
 
         return None
 
     def get_actor_at_location_abs(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.entities_at.get((x, y), ()):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
         return None
 
+    def get_path_cost(self) -> np.ndarray:
+        """Return the read-only pathfinding cost array: 0 for walls, 1 for floor, 11 under blocking entities.
+
+        It is the cost of the distance maps, monsters don't search paths of their own but walk down the
+        shared distance map to the player, see `Engine.player_distance`.
+
+        A lower extra cost means more enemies will crowd behind each other in hallways.
+        A higher one means enemies will take longer paths in order to surround the player.
+        """
+        if self._path_cost is None:
+            self._path_cost = np.array(self.tiles["walkable"], dtype=np.int8)
+            self._path_cost[self.blocked & self.tiles["walkable"]] += 10
+        cost = self._path_cost.view()
+        cost.flags.writeable = False
+        return cost
+
+    def get_distance_map(self, x: int, y: int) -> np.ndarray:
+        """Return the Dijkstra distance from (x, y) to every tile, unreachable tiles have the maximum value."""
+        distance = tcod.path.maxarray((self.width, self.height), order="F")
+        distance[x, y] = 0
+        return tcod.path.dijkstra2d(distance, self.get_path_cost(), 2, 3, out=distance)
+
     def get_location_abs(self, x: int, y: int) -> tuple[int, int]:
         return x + self.block_left, y + self.block_top
 
@@ -113,7 +271,26 @@ class GameMap:
     def get_actor_at_shown_location(self, x: int, y: int) -> Optional[Actor]:
         return self.get_actor_at_location_abs(*self.get_location_abs(x, y))
 
+    def on_tiles_changed(self) -> None:
+        """Must be called after editing `tiles`, drops everything computed from them."""
+        self._torch_light.clear()
+        self._unlit_torches = dict.fromkeys(self._torches)
+        self._lightmap = None
+        self._path_cost = None
+        self.mark_dirty(0, 0, self.width, self.height)
+
+    def _compute_torch_light(self, torch: Torch) -> tuple[tuple[slice, slice], np.ndarray]:
+        """Return the torch's light mask, computed only on the window its radius can reach."""
+        x, y = torch.position
+        radius = torch.radius
+        window = slice(max(0, x - radius), x + radius + 1), slice(max(0, y - radius), y + radius + 1)
+        light = compute_fov(
+            self.tiles["transparent"][window], (x - window[0].start, y - window[1].start), radius=radius
+        )
+        return window, light
+
     def update_fov(self):
+        changed = self.visible.copy()
         self.visible[:] = compute_fov(
             self.tiles["transparent"],
             (self.engine.player.x, self.engine.player.y),
@@ -121,18 +298,29 @@ class GameMap:
         )
         self.explored |= self.visible
 
-        torches = np.full((self.width, self.height), fill_value=False, order="F")
-        for entity in self.entities:
-            if not isinstance(entity, Torch):
-                continue
-            torch_fov = compute_fov(self.tiles["transparent"], entity.position, radius=entity.radius)
-            if not self.explored[entity.position]:
-                torch_fov &= self.explored
-            torches |= torch_fov
-        self.visible |= torches
+        if self._lightmap is None:
+            self._lightmap = np.full((self.width, self.height), fill_value=False, order="F")
+        # A torch on an unexplored cell only lights explored tiles, so it joins the lightmap once its cell is explored.
+        for torch in tuple(self._unlit_torches):
+            if torch not in self._torch_light:
+                self._torch_light[torch] = self._compute_torch_light(torch)
+            window, light = self._torch_light[torch]
+            if self.explored[torch.position]:
+                self._lightmap[window] |= light
+                del self._unlit_torches[torch]
+            else:
+                self.visible[window] |= light & self.explored[window]
+        self.visible |= self._lightmap
         # If a tile is "visible" it should be added to "explored".
         self.explored |= self.visible
 
+        # Newly explored tiles are visible now, so the visibility change covers every tile to redraw.
+        changed ^= self.visible
+        xs = np.flatnonzero(changed.any(axis=1))
+        if xs.size:
+            ys = np.flatnonzero(changed.any(axis=0))
+            self.mark_dirty(xs[0], ys[0], xs[-1] + 1, ys[-1] + 1)
+
     def render(self, console: Console) -> None:
         """
         Renders the map.
@@ -156,9 +344,8 @@ class GameMap:
             console.draw_frame(x=0, y=m_y + height // 4, width=width, height=1, fg=color.red, clear=False)
             console.draw_frame(x=0, y=m_y + height // 4 * 3, width=width, height=1, fg=color.red, clear=False)
 
-        entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda v: v.render_order.value
-        )
+        # Buckets are chained in render order: corpses and torches, items, actors.
+        entities_sorted_for_rendering = chain(self._corpses, self._torches, self._items, self._actors)
 
         for entity in entities_sorted_for_rendering:
             if self.visible[entity.x, entity.y]:
@@ -166,9 +353,42 @@ class GameMap:
                               fg=entity.color)
 
 
+_prefetch_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_prefetch_executor() -> Optional[ProcessPoolExecutor]:
+    """Return the process pool which generates floors ahead of time, None if processes are unavailable."""
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        try:
+            # Spawned, a forked worker would inherit the SDL and tcod state of the game.
+            _prefetch_executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, NotImplementedError):
+            Config.prefetch_floors = False
+        else:
+            atexit.register(shutdown_prefetch_executor)
+    return _prefetch_executor
+
+
+def shutdown_prefetch_executor() -> None:
+    """Stop the prefetching worker, a floor still being generated is dropped."""
+    global _prefetch_executor
+    if _prefetch_executor is not None:
+        _prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        _prefetch_executor = None
+
+
 class GameWorld:
     """
-    Holds the settings for the GameMap, and generates new maps when moving down the stairs.
+    Holds the settings for the GameMap and the visited floors, generates new maps when moving down the stairs.
+
+    The next floor is generated ahead of time in a worker process. Every floor is generated from its own seed
+    derived from `seed`, the game seed by default, so the prefetched and the synchronously generated maps
+    are the same.
+
+    Left floors stay as they are. The last `Config.floor_cache_size` of them are kept in memory, older ones are
+    spilled to records from `savegame.dump_floor` in a temporary file and loaded again when they are visited.
+    Saves hold the records of all the left floors, they are only loaded when visited as well.
     """
 
     def __init__(
@@ -177,7 +397,8 @@ class GameWorld:
             engine: Engine,
             big_map: MapConfig,
             little_map: MapConfig,
-            current_floor: int = 0
+            current_floor: int = 0,
+            seed: Optional[int] = None,
     ):
         self.engine = engine
 
@@ -185,22 +406,154 @@ class GameWorld:
         self.little_map = little_map
 
         self.current_floor = current_floor
+        self.seed = seed if seed is not None else engine.seed
+
+        self._prefetch: Optional[tuple[int, Future]] = None
+
+        # Left floors in memory, least recently left first.
+        self._floors: OrderedDict[int, GameMap] = OrderedDict()
+        # Records of floors in `_floors`, encoded by a save. Valid until the floor is entered again.
+        self._records: dict[int, bytes] = {}
+        # Offset and length of the records of the spilled floors in `_spill_file`.
+        self._spilled: dict[int, tuple[int, int]] = {}
+        self._spill_file: Optional[BinaryIO] = None
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_prefetch"] = None  # A pending future can't be saved, the floor is generated again.
+        state["_floors"] = OrderedDict()
+        state["_records"] = {}
+        state["_spilled"] = {}
+        state["_spill_file"] = None
+        state["_saved_floors"] = {floor: self._record(floor) for floor in chain(self._floors, self._spilled)}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        saved_floors = state.pop("_saved_floors", {})
+        self.__dict__.update(state)
+        # Saves from before the floors were kept.
+        self.__dict__.setdefault("_floors", OrderedDict())
+        self.__dict__.setdefault("_records", {})
+        self.__dict__.setdefault("_spilled", {})
+        self.__dict__.setdefault("_spill_file", None)
+        for floor, record in saved_floors.items():
+            self._spill(floor, record)
 
-    def generate_floor(self) -> None:
-        from procgen import generate_dungeon
+    @property
+    def visited_floors(self) -> list[int]:
+        """The floors which were left, in memory or spilled."""
+        return sorted(chain(self._floors, self._spilled))
 
-        self.current_floor += 1
+    def get_config(self, floor: int) -> MapConfig:
+        if floor % Config.big_floor == 0:
+            return self.big_map
+        return self.little_map
 
-        if self.current_floor % Config.big_floor == 0:
-            config = self.big_map
-        else:
-            config = self.little_map
-
-        self.engine.game_map = generate_dungeon(
-            max_rooms=config.max_rooms,
-            room_min_size=config.room_min_size,
-            room_max_size=config.room_max_size,
-            map_width=config.width,
-            map_height=config.height,
-            engine=self.engine,
-        )
+    def get_floor_seed(self, floor: int) -> str:
+        return f"{self.seed}:{floor}"
+
+    def generate_floor(self) -> None:
+        """Move down to the next floor, it is generated on the first visit."""
+        self.change_floor(self.current_floor + 1)
+
+    def change_floor(self, floor: int) -> None:
+        """Leave the current floor for `floor`, arriving at the stairs leading back to the current one."""
+        from procgen import generate_seeded_map
+        import savegame
+
+        descending = floor > self.current_floor
+        if getattr(self.engine, "game_map", None) is not None and self.current_floor:
+            self._floors[self.current_floor] = self.engine.game_map
+        self.current_floor = floor
+
+        dungeon = self._floors.pop(floor, None)
+        self._records.pop(floor, None)
+        if dungeon is None and floor in self._spilled:
+            offset, length = self._spilled.pop(floor)
+            self._spill_file.seek(offset)
+            dungeon = savegame.load_floor(self._spill_file.read(length), self.engine)
+
+        if dungeon is not None:
+            arrival = dungeon.upstairs_location if descending else dungeon.downstairs_location
+            self.engine.player.place(*(arrival or dungeon.player_start), dungeon)
+            self.engine.game_map = dungeon
+            self._evict_floors()
+            if floor + 1 not in self._floors and floor + 1 not in self._spilled and self._prefetch is None:
+                self.prefetch_floor(floor + 1)
+            return
+
+        if self._prefetch is not None:
+            prefetched_floor, future = self._prefetch
+            self._prefetch = None
+            if prefetched_floor == floor and future.done() and future.exception() is None:
+                dungeon = future.result()
+            else:
+                future.cancel()
+        if dungeon is None:
+            dungeon = generate_seeded_map(self.get_config(floor), floor, self.get_floor_seed(floor))
+
+        dungeon.engine = self.engine
+        self.engine.player.place(*dungeon.player_start, dungeon)
+        self.engine.game_map = dungeon
+        self._evict_floors()
+
+        self.prefetch_floor(floor + 1)
+
+    def _evict_floors(self) -> None:
+        """Spill the least recently left floors beyond `Config.floor_cache_size`.
+
+        Called once the player is on the new floor, the record of the floor just left must not hold the player.
+        """
+        while len(self._floors) > Config.floor_cache_size:
+            oldest = next(iter(self._floors))
+            record = self._record(oldest)
+            del self._floors[oldest], self._records[oldest]
+            self._spill(oldest, record)
+
+    def _record(self, floor: int) -> bytes:
+        """Return the record of a left floor, in memory or spilled."""
+        import savegame
+
+        if floor in self._spilled:
+            offset, length = self._spilled[floor]
+            self._spill_file.seek(offset)
+            return self._spill_file.read(length)
+        if floor not in self._records:
+            self._records[floor] = savegame.dump_floor(self._floors[floor], Config.floor_compressor)
+        return self._records[floor]
+
+    def _spill(self, floor: int, record: bytes) -> None:
+        """Write the record of a left floor to the spill file."""
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix="floors-")
+        # Records are appended, a floor entered again leaves its old record unused. Once the unused bytes
+        # outweigh the used ones the file is rewritten, so it stays within twice the size of the records.
+        end = self._spill_file.seek(0, 2)
+        if end > 2 * sum(length for _, length in self._spilled.values()):
+            self._compact_spill()
+        self._spilled[floor] = self._spill_file.tell(), len(record)
+        self._spill_file.write(record)
+
+    def _compact_spill(self) -> None:
+        """Rewrite the spill file with only the records of the spilled floors, leaving it at the end."""
+        records = [(floor, self._record(floor)) for floor in self._spilled]
+        self._spill_file.seek(0)
+        self._spill_file.truncate()
+        for floor, record in records:
+            self._spilled[floor] = self._spill_file.tell(), len(record)
+            self._spill_file.write(record)
+
+    def prefetch_floor(self, floor: int) -> None:
+        """Start generating `floor` in the background, `generate_floor` picks it up when it is ready."""
+        from procgen import generate_seeded_map
+
+        if not Config.prefetch_floors or (executor := get_prefetch_executor()) is None:
+            return
+        try:
+            self._prefetch = floor, executor.submit(
+                generate_seeded_map, self.get_config(floor), floor, self.get_floor_seed(floor)
+            )
+        except BrokenProcessPool:
+            # The worker died, e.g. it couldn't import the main script. Floors are generated in the foreground.
+            shutdown_prefetch_executor()
+            Config.prefetch_floors = False
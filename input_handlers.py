@@ -722,7 +722,9 @@ class MainGameEventHandler(EventHandler):
 
         player = self.engine.player
 
-        if key == tcod.event.K_PERIOD and modifier & (tcod.event.KMOD_LSHIFT | tcod.event.KMOD_RSHIFT):
+        # ">" and "<"
+        shift = modifier & (tcod.event.KMOD_LSHIFT | tcod.event.KMOD_RSHIFT)
+        if key in (tcod.event.K_PERIOD, tcod.event.K_COMMA) and shift:
             return TakeStairsAction(player)
 
         if key in MOVE_KEYS:
@@ -785,8 +787,14 @@ class MainGameEventHandler(EventHandler):
 class GameOverEventHandler(EventHandler):
     def on_quit(self) -> None:
         """Handle exiting out of a finished game."""
+        import savegame
+
+        # A save still being written would bring the file back.
+        savegame.wait_for_writes()
         if os.path.exists(Config.save_name):
             os.remove(Config.save_name)  # Deletes the active save file.
+        if os.path.exists(Config.save_journal):
+            os.remove(Config.save_journal)
         raise exceptions.QuitWithoutSaving()  # Avoid saving a finished game.
 
     def ev_quit(self, event: tcod.event.Quit) -> None:
@@ -810,7 +818,7 @@ class HistoryViewer(EventHandler):
 
     def __init__(self, engine: Engine):
         super().__init__(engine)
-        self.log_length = len(engine.message_log.messages)
+        self.log_length = len(engine.message_log)
         self.cursor = self.log_length - 1
 
     def on_render(self, console: tcod.Console) -> None:
@@ -825,13 +833,15 @@ class HistoryViewer(EventHandler):
         )
 
         # Render the message log using the cursor parameter.
+        # Every message takes a line at least, so only the messages which can fit are read.
+        height = log_console.height - 2
         self.engine.message_log.render_messages(
             log_console,
             1,
             1,
             log_console.width - 2,
-            log_console.height - 2,
-            self.engine.message_log.messages[: self.cursor + 1],
+            height,
+            self.engine.message_log.get_range(self.cursor + 1 - height, self.cursor + 1),
         )
         log_console.blit(console, 3, 3)
 
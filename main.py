@@ -5,10 +5,12 @@ import tcod
 import tcod.render
 import tcod.sdl.render
 
+from autosave import Autosave
 import color
 from config import Config
 import exceptions
 import input_handlers
+import savegame
 import setup_game
 
 
@@ -25,6 +27,7 @@ def main() -> None:
     )
 
     handler: input_handlers.BaseEventHandler = setup_game.MainMenu()
+    autosave = Autosave(Config.save_name, Config.save_journal) if Config.autosave else None
 
     if "debug" in sys.argv:
         Config.DEBUG = True
@@ -81,6 +84,9 @@ def main() -> None:
                     for event in tcod.event.wait():
                         context.convert_event(event)
                         handler = handler.handle_events(event)
+                    if autosave and isinstance(handler, input_handlers.EventHandler):
+                        autosave.update(handler.engine)
+                    savegame.run_callbacks()
                 except Exception:  # Handle exceptions in game.
                     traceback.print_exc()  # Print error to stderr.
                     # Then print the error to the message log.
@@ -1,9 +1,18 @@
-from typing import Iterable, Reversible
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections import deque
+from itertools import islice
+import pickle
+import tempfile
+from typing import BinaryIO, Iterable, Optional, Reversible, Sequence
 import textwrap
+import zlib
 
 import tcod
 
 import color
+from config import Config
 
 
 class Message:
@@ -20,9 +29,150 @@ class Message:
         return self.plain_text
 
 
+class MessageHistory:
+    """The messages moved out of a `MessageLog`, in zlib compressed blocks appended to a temporary file.
+
+    The blocks are indexed, reading a message only decompresses its block.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._file: Optional[BinaryIO] = None
+        # Offset and length in `_file` of every block and the index of its first message.
+        self._blocks: list[tuple[int, int]] = []
+        self._starts: list[int] = []
+        # The last read block, the history viewer reads the same blocks over and over.
+        self._cached: tuple[int, list[Message]] = (-1, [])
+
+    def __getstate__(self) -> dict:
+        return {"blocks": self.raw_blocks()}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__()
+        for count, data in state["blocks"]:
+            self.add_block(count, data)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, messages: Sequence[Message]) -> None:
+        """Write `messages` as a new block."""
+        data = pickle.dumps(
+            [(message.plain_text, message.fg, message.count) for message in messages],
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        self.add_block(len(messages), zlib.compress(data))
+
+    def add_block(self, count: int, data: bytes) -> None:
+        """Append a compressed block of `count` messages, as returned by `raw_blocks`."""
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="messages-")
+        self._file.seek(0, 2)
+        self._blocks.append((self._file.tell(), len(data)))
+        self._starts.append(self.count)
+        self._file.write(data)
+        self.count += count
+
+    def raw_blocks(self) -> list[tuple[int, bytes]]:
+        """Return the message count and the compressed data of every block."""
+        return [
+            (self._block_end(index) - self._starts[index], self._read(index)) for index in range(len(self._blocks))
+        ]
+
+    def get_range(self, start: int, stop: int) -> list[Message]:
+        """Return the messages from `start` to `stop`, only reading the blocks which hold them."""
+        start, stop = max(0, start), min(stop, self.count)
+        messages: list[Message] = []
+        index = bisect_right(self._starts, start) - 1
+        while start < stop:
+            block = self._load(index)
+            offset = start - self._starts[index]
+            messages.extend(block[offset:offset + stop - start])
+            start = self._block_end(index)
+            index += 1
+        return messages
+
+    def _block_end(self, index: int) -> int:
+        return self._starts[index + 1] if index + 1 < len(self._starts) else self.count
+
+    def _read(self, index: int) -> bytes:
+        offset, length = self._blocks[index]
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def _load(self, index: int) -> list[Message]:
+        if self._cached[0] != index:
+            messages = []
+            for text, fg, count in pickle.loads(zlib.decompress(self._read(index))):
+                message = Message(text, fg)
+                message.count = count
+                messages.append(message)
+            self._cached = index, messages
+        return self._cached[1]
+
+
 class MessageLog:
+    """The latest messages in a ring buffer of `Config.message_log_size`, older ones are moved to `history`.
+
+    Messages are counted from the first one ever added, `get_range` reads from both parts.
+    """
+
     def __init__(self) -> None:
-        self.messages: list[Message] = []
+        self._messages: deque[Message] = deque()
+        self.history = MessageHistory()
+
+    def __getstate__(self) -> dict:
+        return {"messages": list(self._messages), "history": self.history}
+
+    def __setstate__(self, state: dict) -> None:
+        # Saves from before the history was split off hold every message in `messages` and no history.
+        self._messages = deque()
+        self.history = state.get("history") or MessageHistory()
+        self.extend(state["messages"])
+
+    def __len__(self) -> int:
+        return self.history.count + len(self._messages)
+
+    @property
+    def recent(self) -> deque[Message]:
+        """The messages in memory, the latest ones."""
+        return self._messages
+
+    def get_range(self, start: int, stop: int) -> list[Message]:
+        """Return the messages from `start` to `stop`, reading the history only if they reach into it."""
+        spilled = self.history.count
+        messages = self.history.get_range(start, stop) if start < spilled else []
+        messages.extend(islice(self._messages, max(0, start - spilled), max(0, stop - spilled)))
+        return messages
+
+    def without_history(self) -> MessageLog:
+        """Return a copy sharing the messages in memory with an empty history, saves store the history apart."""
+        log = MessageLog.__new__(MessageLog)
+        log.__dict__.update(self.__dict__)
+        log.history = MessageHistory()
+        return log
+
+    def since(self, index: int) -> list[Message]:
+        """Return the messages from `index` on."""
+        return self.get_range(index, len(self))
+
+    def replace_since(self, index: int, messages: Iterable[Message]) -> None:
+        """Replace the messages from `index` on with `messages`, `index` must be in memory."""
+        for _ in range(len(self) - index):
+            self._messages.pop()
+        self.extend(messages)
+
+    def extend(self, messages: Iterable[Message]) -> None:
+        """Append messages as they are, without stacking them."""
+        for message in messages:
+            self._append(message)
+
+    def _append(self, message: Message) -> None:
+        self._messages.append(message)
+        if len(self._messages) > Config.message_log_size:
+            # The history is written a block at a time, the buffer keeps the rest.
+            block = min(Config.message_block_size, len(self._messages) - 1)
+            self.history.append([self._messages.popleft() for _ in range(block)])
 
     def add_message(self, text: str, fg: tuple[int, int, int] = color.white, *, stack: bool = True) -> None:
         """Add a message to this log.
@@ -32,10 +182,10 @@ class MessageLog:
         If `stack` is True then the message can stack with a previous message
         of the same text.
         """
-        if stack and self.messages and text == self.messages[-1].plain_text:
-            self.messages[-1].count += 1
+        if stack and self._messages and text == self._messages[-1].plain_text:
+            self._messages[-1].count += 1
         else:
-            self.messages.append(Message(text, fg))
+            self._append(Message(text, fg))
 
     def render(self, console: tcod.Console, x: int, y: int, width: int, height: int) -> None:
         """Render this log over the given area.
@@ -43,7 +193,7 @@ class MessageLog:
         `x`, `y`, `width`, `height` is the rectangular region to render onto
         the `console`.
         """
-        self.render_messages(console, x, y, width, height, self.messages)
+        self.render_messages(console, x, y, width, height, self._messages)
 
     @staticmethod
     def wrap(string: str, width: int) -> Iterable[str]:
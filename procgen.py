@@ -1,20 +1,21 @@
 from __future__ import annotations
 
-import random
-from itertools import product
-from typing import Iterator, TYPE_CHECKING
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import accumulate
+from typing import Optional, TYPE_CHECKING
 
-import tcod
+import numpy as np  # type: ignore
 
 import entities.enemies
 import entities.equipment
 import entities.items
-from config import Config
+from config import Config, MapConfig
 from game_map import GameMap
+import rng
 import tile_types
 
 if TYPE_CHECKING:
-    from engine import Engine
     from entities.factory import Factory
 
 max_items_by_floor = [
@@ -88,31 +89,65 @@ def get_max_value_for_floor(max_value_by_floor: list[tuple[int, int]], floor: in
     return current_value
 
 
-def get_entities_at_random(
+@dataclass(frozen=True)
+class SpawnTable:
+    """What can spawn in a room of one floor: the factories with their cumulative weights and the maximum count."""
+    factories: tuple[Factory, ...]
+    cum_weights: tuple[int, ...]
+    max_count: int
+
+    def draw(self, counts: list[int]) -> list[list[Factory]]:
+        """Return the factories of several rooms, `counts[i]` for room i, drawn in one call."""
+        if not self.factories:
+            return [[] for _ in counts]
+        chosen = rng.loot.choices(self.factories, cum_weights=self.cum_weights, k=sum(counts))
+        rooms = []
+        start = 0
+        for count in counts:
+            rooms.append(chosen[start:start + count])
+            start += count
+        return rooms
+
+
+def compile_spawn_table(
         weighted_chances_by_floor: dict[int, list[tuple[Factory, int]]],
-        number_of_entities: int,
+        max_value_by_floor: list[tuple[int, int]],
         floor: int,
-) -> list[Factory]:
+) -> SpawnTable:
     entity_weighted_chances = {}
 
     for key, values in weighted_chances_by_floor.items():
         if key > floor:
             continue
         else:
-            for value in values:
-                entity = value[0]
-                weighted_chance = value[1]
-
+            for entity, weighted_chance in values:
                 entity_weighted_chances[entity] = weighted_chance
 
-    entities = list(entity_weighted_chances.keys())
-    entity_weighted_chance_values = list(entity_weighted_chances.values())
+    return SpawnTable(
+        tuple(entity_weighted_chances),
+        tuple(accumulate(entity_weighted_chances.values())),
+        get_max_value_for_floor(max_value_by_floor, floor),
+    )
+
 
-    chosen_entities = random.choices(
-        entities, weights=entity_weighted_chance_values, k=number_of_entities
+@lru_cache(maxsize=None)
+def get_spawn_tables(floor: int) -> tuple[SpawnTable, SpawnTable]:
+    """Return the monster and item spawn tables of a floor, compiled once."""
+    return (
+        compile_spawn_table(enemy_chances, max_monsters_by_floor, floor),
+        compile_spawn_table(item_chances, max_items_by_floor, floor),
     )
 
-    return chosen_entities
+
+def draw_floor_spawns(floor: int, rooms: int) -> list[list[Factory]]:
+    """Return the monsters followed by the items of every room of a floor."""
+    monster_table, item_table = get_spawn_tables(floor)
+    monster_counts = [rng.loot.randint(0, monster_table.max_count) for _ in range(rooms)]
+    item_counts = [rng.loot.randint(0, item_table.max_count) for _ in range(rooms)]
+    return [
+        monsters + items
+        for monsters, items in zip(monster_table.draw(monster_counts), item_table.draw(item_counts))
+    ]
 
 
 class RectangularRoom:
@@ -134,6 +169,16 @@ class RectangularRoom:
         """Return the inner area of this room as a 2D array index."""
         return slice(self.x1 + 1, self.x2), slice(self.y1 + 1, self.y2)
 
+    @property
+    def outer(self) -> tuple[slice, slice]:
+        """Return the whole room, walls included, as a 2D array index."""
+        return slice(self.x1, self.x2 + 1), slice(self.y1, self.y2 + 1)
+
+    @property
+    def columns(self) -> tuple[slice, slice]:
+        """Return the columns of this room, one every 4 tiles, as a 2D array index."""
+        return slice(self.x1 + 3, self.x2 - 1, 4), slice(self.y1 + 3, self.y2 - 1, 4)
+
     def intersects(self, other: RectangularRoom) -> bool:
         """Return True if this room overlaps with another RectangularRoom."""
         return (
@@ -144,119 +189,126 @@ class RectangularRoom:
         )
 
 
-def tunnel_between(
-        start: tuple[int, int], end: tuple[int, int]
-) -> Iterator[tuple[int, int]]:
-    """Return an L-shaped tunnel between these two points."""
+def generate_rooms(config: MapConfig) -> list[RectangularRoom]:
+    """Return up to `config.max_rooms` rooms which don't overlap, in placement order.
+
+    All candidates are drawn at once, each one is checked against an occupancy grid of the rooms accepted so far.
+    """
+    generator = np.random.default_rng(rng.dungeon.getrandbits(64))
+    count = config.max_rooms
+
+    # plus one for real size
+    widths = generator.integers(config.room_min_size, config.room_max_size, count, endpoint=True) + 1
+    heights = generator.integers(config.room_min_size, config.room_max_size, count, endpoint=True) + 1
+    xs = generator.integers(0, config.width - widths - 1, endpoint=True)
+    ys = generator.integers(0, config.height - heights - 1, endpoint=True)
+
+    occupied = np.zeros((config.width, config.height), dtype=bool)
+    rooms: list[RectangularRoom] = []
+    for x, y, width, height in zip(xs.tolist(), ys.tolist(), widths.tolist(), heights.tolist()):
+        room = RectangularRoom(x, y, width, height)
+        if occupied[room.outer].any():
+            continue  # This room intersects, so go to the next candidate.
+        occupied[room.outer] = True
+        rooms.append(room)
+    return rooms
+
+
+def tunnel_between(start: tuple[int, int], end: tuple[int, int]) -> list[tuple[slice, slice]]:
+    """Return an L-shaped tunnel between these two points as two 2D array indexes."""
     x1, y1 = start
     x2, y2 = end
-    if random.random() < 0.5:  # 50% chance.
+    if rng.dungeon.random() < 0.5:  # 50% chance.
         # Move horizontally, then vertically.
         corner_x, corner_y = x2, y1
     else:
         # Move vertically, then horizontally.
         corner_x, corner_y = x1, y2
 
-    # Generate the coordinates for this tunnel.
-    for x, y in tcod.los.bresenham((x1, y1), (corner_x, corner_y)).tolist():
-        yield x, y
-    for x, y in tcod.los.bresenham((corner_x, corner_y), (x2, y2)).tolist():
-        yield x, y
-
-
-def place_entities(room: RectangularRoom, dungeon: GameMap, floor_number: int) -> None:
-    number_of_monsters = random.randint(
-        0, get_max_value_for_floor(max_monsters_by_floor, floor_number)
-    )
-    number_of_items = random.randint(
-        0, get_max_value_for_floor(max_items_by_floor, floor_number)
-    )
-
-    monsters: list[Factory] = get_entities_at_random(
-        enemy_chances, number_of_monsters, floor_number
-    )
-    items: list[Factory] = get_entities_at_random(
-        item_chances, number_of_items, floor_number
-    )
-
-    for factory in monsters + items:
-        tries = 0
-        while tries < 20:
-            x = random.randint(room.x1 + 1, room.x2 - 1)
-            y = random.randint(room.y1 + 1, room.y2 - 1)
-            if not dungeon.tiles[x, y] == tile_types.floor:
-                tries += 1
-                continue
-            if any(entity_.x == x and entity_.y == y for entity_ in dungeon.entities):
-                tries += 1
-                continue
-            entity = factory.construct(floor_number)
-            entity.place(x, y, dungeon)
-            break
-
-
-def generate_dungeon(
-        max_rooms: int,
-        room_min_size: int,
-        room_max_size: int,
-        map_width: int,
-        map_height: int,
-        engine: Engine,
-) -> GameMap:
-    """Generate a new dungeon map."""
-    player = engine.player
-    dungeon = GameMap(engine, map_width, map_height, entities=[player])
-
-    rooms: list[RectangularRoom] = []
-
-    for r in range(max_rooms):
-        # plus one for real size
-        room_width = random.randint(room_min_size, room_max_size) + 1
-        room_height = random.randint(room_min_size, room_max_size) + 1
-
-        x = random.randint(0, dungeon.width - room_width - 1)
-        y = random.randint(0, dungeon.height - room_height - 1)
-
-        # "RectangularRoom" class makes rectangles easier to work with
-        room = RectangularRoom(x, y, room_width, room_height)
-
-        # Run through the other rooms and see if they intersect with this one.
-        if any(room.intersects(other_room) for other_room in rooms):
-            continue  # This room intersects, so go to the next attempt.
-        # If there are no intersections then the room is valid.
-
-        # Dig out this rooms inner area.
+    return [
+        (slice(min(x1, corner_x), max(x1, corner_x) + 1), slice(min(y1, corner_y), max(y1, corner_y) + 1)),
+        (slice(min(corner_x, x2), max(corner_x, x2) + 1), slice(min(corner_y, y2), max(corner_y, y2) + 1)),
+    ]
+
+
+def place_entities(
+        room: RectangularRoom,
+        dungeon: GameMap,
+        floor_number: int,
+        occupied: Optional[np.ndarray] = None,
+        density: Optional[float] = None,
+        spawns: Optional[list[Factory]] = None,
+) -> None:
+    """Spawn the monsters and items of a room on distinct free floor tiles.
+
+    `spawns` are the factories of the room from `draw_floor_spawns`, drawn here when not given. `occupied` marks
+    the tiles already holding an entity and is updated, it is built from the dungeon entities when not given.
+    At most `density` of the free tiles of the room are filled, `MapConfig.entity_density` when not given.
+    """
+    if spawns is None:
+        spawns = draw_floor_spawns(floor_number, 1)[0]
+    if density is None:
+        density = MapConfig.entity_density
+
+    if occupied is None:
+        occupied = np.zeros((dungeon.width, dungeon.height), dtype=bool)
+        for entity in dungeon.entities:
+            occupied[entity.x, entity.y] = True
+
+    free = np.argwhere(dungeon.tiles["walkable"][room.inner] & ~occupied[room.inner]) + (room.x1 + 1, room.y1 + 1)
+    count = min(len(spawns), int(len(free) * density))
+    for factory, index in zip(spawns, rng.dungeon.sample(range(len(free)), count)):
+        x, y = free[index].tolist()
+        entity = factory.construct(floor_number)
+        entity.place(x, y, dungeon)
+        occupied[x, y] = True
+
+
+def generate_map(config: MapConfig, floor_number: int) -> GameMap:
+    """Generate a new dungeon map without an engine.
+
+    The map is not attached to an engine and the player is not placed, its start position is stored in
+    `player_start`; `GameWorld.change_floor` attaches the map and places the player there.
+    """
+    dungeon = GameMap(None, config.width, config.height)
+    occupied = np.zeros((config.width, config.height), dtype=bool)
+
+    rooms = generate_rooms(config)
+    # The first room is left empty, it's where the player starts.
+    spawns = draw_floor_spawns(floor_number, len(rooms) - 1) if rooms else []
+    for i, room in enumerate(rooms):
+        # Dig out this rooms inner area and place its columns.
         dungeon.tiles[room.inner] = tile_types.floor
-        # Place columns in room
-        for x, y in product(range(room.x1 + 3, room.x2 - 1, 4), range(room.y1 + 3, room.y2 - 1, 4)):
-            dungeon.tiles[x, y] = tile_types.wall
+        dungeon.tiles[room.columns] = tile_types.wall
 
-        if len(rooms) == 0:
+        if i == 0:
             # The first room, where the player starts.
             p_x, p_y = room.center
             if dungeon.tiles[room.center] != tile_types.floor:
                 p_x, p_y = p_x + 1, p_y + 1
 
-            player.place(p_x, p_y, dungeon)
+            dungeon.player_start = p_x, p_y
         else:  # All rooms after the first.
             # Dig out a tunnel between this room and the previous one.
-            for x, y in tunnel_between(rooms[-1].center, room.center):
-                dungeon.tiles[x, y] = tile_types.floor
+            for segment in tunnel_between(rooms[i - 1].center, room.center):
+                dungeon.tiles[segment] = tile_types.floor
 
-            place_entities(room, dungeon, engine.game_world.current_floor)
-
-        # Finally, append the new room to the list.
-        rooms.append(room)
+            place_entities(room, dungeon, floor_number, occupied, config.entity_density, spawns[i - 1])
 
     # replace columns in room (because of tunnels)
     for room in rooms:
-        for x, y in product(range(room.x1 + 3, room.x2 - 1, 4), range(room.y1 + 3, room.y2 - 1, 4)):
-            dungeon.tiles[x, y] = tile_types.wall
+        dungeon.tiles[room.columns] = tile_types.wall
 
-    farthest = player.position
-    for room in rooms:
-        if player.distance(*room.center) > player.distance(*farthest):
-            farthest = room.center
+    farthest = dungeon.player_start
+    if rooms:
+        centers = np.array([room.center for room in rooms])
+        distances = np.hypot(*(centers - dungeon.player_start).T)
+        if distances.max() > 0:
+            farthest = tuple(centers[distances.argmax()].tolist())
+
+    if floor_number > 1:
+        dungeon.tiles[dungeon.player_start] = tile_types.up_stairs
+        dungeon.upstairs_location = dungeon.player_start
 
     s_x, s_y = farthest
     if dungeon.tiles[farthest] != tile_types.floor:
@@ -264,5 +316,15 @@ def generate_dungeon(
 
     dungeon.tiles[s_x, s_y] = tile_types.down_stairs
     dungeon.downstairs_location = s_x, s_y
+    dungeon.on_tiles_changed()
 
     return dungeon
+
+
+def generate_seeded_map(config: MapConfig, floor_number: int, seed: str) -> GameMap:
+    """Generate a map with `generate_map` from its own random streams, the game streams are left untouched.
+
+    Also runs in floor prefetching worker processes.
+    """
+    with rng.using(rng.RandomStreams(seed)):
+        return generate_map(config, floor_number)
@@ -1,52 +1,83 @@
 from __future__ import annotations
 
 import random
-from typing import Union
+from typing import Optional, Union
+
+import rng
 
 
 class Range:
+    """Immutable integer range [start, stop], converting it to int picks a random value."""
+
+    __slots__ = ("_start", "_stop", "_str")
+
     def __init__(self, value=0, stop=None):
-        self._value = value
-        self._stop = stop or value
+        stop = stop or value
+        if value > stop:
+            value, stop = stop, value
+        self._start = value
+        self._stop = stop
+        self._str = None
+
+    @classmethod
+    def _make(cls, start: int, stop: int) -> Range:
+        """Build a range from already ordered bounds."""
+        value = cls.__new__(cls)
+        value._start = start
+        value._stop = stop
+        value._str = None
+        return value
+
+    @property
+    def start(self) -> int:
+        return self._start
 
-        if self._value > self._stop:
-            self._value, self._stop = self._stop, self._value
+    @property
+    def stop(self) -> int:
+        return self._stop
 
     @property
     def value(self) -> int:
         return int(self)
 
     def __int__(self):
-        return random.randint(self._value, self._stop)
+        if self._start == self._stop:
+            return self._start
+        return rng.combat.randint(self._start, self._stop)
 
-    def __add__(self, other) -> Range:
-        value = Range(self._value, self._stop)
-        value += other
-        return value
+    def sample(self, count: int, generator: Optional[random.Random] = None) -> list[int]:
+        """Return `count` random values of this range drawn at once from `generator`, the combat stream by default."""
+        if self._start == self._stop:
+            return [self._start] * count
+        return (generator or rng.combat).choices(range(self._start, self._stop + 1), k=count)
 
-    def __iadd__(self, other: Union[int, Range]) -> Range:
+    def __add__(self, other: Union[int, Range]) -> Range:
         if isinstance(other, Range):
-            self._value += other._value
-            self._stop += other._stop
-        else:
-            self._value += other
-            self._stop += other
-        return self
+            return Range._make(self._start + other._start, self._stop + other._stop)
+        return Range._make(self._start + other, self._stop + other)
 
     def __mul__(self, other: float) -> Range:
         if not isinstance(other, (float, int)):
-            raise NotImplemented
+            return NotImplemented
         assert other >= 1
-        value = Range(self._value, self._stop)
-        value._value = int(value._value * other)
-        value._stop = int(value._stop * other)
-        return value
+        return Range._make(int(self._start * other), int(self._stop * other))
+
+    def __getstate__(self) -> tuple[int, int]:
+        return self._start, self._stop
+
+    def __setstate__(self, state: Union[tuple[int, int], dict]) -> None:
+        if isinstance(state, dict):  # Saves from before the slots hold the `__dict__` of the range.
+            state = state["_value"], state["_stop"]
+        self._start, self._stop = state
+        self._str = None
 
     def __str__(self):
-        if self._value == self._stop:
-            return str(self._value)
-        else:
-            return f"{self._value}-{self._stop}"
+        if self._str is None:
+            if self._start == self._stop:
+                self._str = str(self._start)
+            else:
+                self._str = f"{self._start}-{self._stop}"
+        return self._str
 
     def __gt__(self, other):
-        return self._value > other
+        return self._start > other
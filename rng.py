@@ -0,0 +1,63 @@
+"""Seeded random number streams, one per subsystem.
+
+Every subsystem draws from its own `random.Random`, all derived from the game seed, so e.g. AI decisions don't
+shift combat rolls and a saved game continues with the same numbers. The streams belong to the engine
+(`Engine.rng`) and are installed here with `use`; code reads them through the module, as `rng.combat`,
+never with `from rng import combat`.
+"""
+from __future__ import annotations
+
+import random
+from contextlib import contextmanager
+from typing import Iterator
+
+# Room layout and entity positions.
+dungeon = random.Random()
+# What is spawned on a floor and how enemies and equipment are leveled for it.
+loot = random.Random()
+# Damage, defense and target rolls.
+combat = random.Random()
+# Monster decisions.
+ai = random.Random()
+
+
+class RandomStreams:
+    """The random streams of one game, derived from `seed`. Saved with the engine."""
+
+    names = ("dungeon", "loot", "combat", "ai")
+
+    def __init__(self, seed: int | str):
+        self.seed = seed
+        self.dungeon = random.Random(f"{seed}:dungeon")
+        self.loot = random.Random(f"{seed}:loot")
+        self.combat = random.Random(f"{seed}:combat")
+        self.ai = random.Random(f"{seed}:ai")
+
+
+def current() -> RandomStreams:
+    """Return the installed streams."""
+    streams = RandomStreams.__new__(RandomStreams)
+    streams.seed = None
+    for name in RandomStreams.names:
+        setattr(streams, name, globals()[name])
+    return streams
+
+
+def use(streams: RandomStreams) -> None:
+    """Make every subsystem draw from `streams`."""
+    global dungeon, loot, combat, ai
+    dungeon = streams.dungeon
+    loot = streams.loot
+    combat = streams.combat
+    ai = streams.ai
+
+
+@contextmanager
+def using(streams: RandomStreams) -> Iterator[RandomStreams]:
+    """Install `streams` for the duration of the block, then restore the previous ones."""
+    previous = current()
+    use(streams)
+    try:
+        yield streams
+    finally:
+        use(previous)
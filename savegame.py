@@ -0,0 +1,555 @@
+"""Versioned save file format.
+
+A save is a fixed header, the compressed body, then the message history:
+
+    header   magic b"DWSAVE", format version (u16), compressor id (u8), compressed body length (u64)
+    body     sections, each one a 4 byte name, a u64 length and the payload
+    history  a HIST section, not compressed as a whole
+
+Body sections, in file order:
+
+    MAPS  map count (u32), then for every map its width and height (u16 each) and the raw `tiles`,
+          `explored` and `visible` arrays
+    ENTS  entity count (u32), then one `ENTITY_DTYPE` record per entity
+    NAME  the entity names, utf-8, separated by NUL, indexed by the `name` field of the records
+    STAT  a pickle stream with the rest of the state: the engine first, then (kind, index, state) records for
+          every entity and map, closed by None. The engine, maps and entities are pickled as references.
+          Map states list the record indexes of their entities as `entity_order`.
+          The message log only holds the messages in memory, not its `MessageHistory`.
+
+HIST holds the message history: the block count (u32), then for every block its message count (u32), length
+(u64) and data, as `MessageHistory.raw_blocks` returns them. The blocks are copied as they are both ways,
+the history is only decompressed when it is read.
+
+The body is decompressed while it is read, sections are read straight into their arrays and the state is
+unpickled from the stream. Entity indexes, lighting, path costs and rendered colors are not saved, they are
+rebuilt on load. Files without the magic are loaded as the previous format, the pickled engine compressed
+with LZMA, and brought up to date by `_upgrade_legacy`.
+
+`dump_floor` writes a single map with the same header and body, the engine and the player as references.
+`GameWorld` keeps these records of the left floors and saves them with its state.
+"""
+from __future__ import annotations
+
+import io
+import lzma
+import os
+import pickle
+import random
+import struct
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Optional
+
+import numpy as np  # type: ignore
+
+from engine import Engine
+from entity import Actor, Entity, Item, Torch
+from game_map import GameMap
+from message_log import MessageLog
+from render_order import RenderOrder
+import rng
+import tile_types
+
+MAGIC = b"DWSAVE"
+# The previous format is a bare LZMA stream.
+LEGACY_MAGIC = b"\xfd7zXZ\x00"
+VERSION = 1
+
+HEADER = struct.Struct("<6sHBQ")
+SECTION = struct.Struct("<4sQ")
+COUNT = struct.Struct("<I")
+MAP_SIZE = struct.Struct("<HH")
+BLOCK = struct.Struct("<IQ")
+
+# Compressed bytes decompressed at a time while loading.
+READ_SIZE = 1 << 16
+
+# zlib at level 1 is the fast option, LZMA the small one.
+COMPRESSORS = {"none": 0, "zlib": 1, "lzma": 2}
+
+ENTITY_KINDS = (Entity, Actor, Item, Torch)
+ENTITY_DTYPE = np.dtype([
+    ("kind", np.uint8),
+    ("x", np.int16),
+    ("y", np.int16),
+    ("char", np.uint32),
+    ("color", np.uint8, 3),
+    ("name", np.uint32),
+    ("blocks_movement", np.bool_),
+    ("render_order", np.uint8),
+    ("dungeon_level", np.int16),
+])
+# Entity attributes stored in the records, everything else goes to the pickled state.
+RECORD_FIELDS = frozenset({"x", "y", "char", "color", "name", "blocks_movement", "render_order", "dungeon_level"})
+
+MAP_ARRAYS = {"tiles": tile_types.tile_dt, "explored": np.bool_, "visible": np.bool_}
+# GameMap attributes rebuilt from the arrays and entities on load.
+MAP_DERIVED = frozenset({
+    "entities", "entities_at", "blocked", "_path_cost", "_actors", "_corpses", "_items", "_torches",
+    "_torch_light", "_unlit_torches", "_lightmap", "tiles_rgb", "_dirty", "_changed",
+})
+
+
+def compress(data: bytes, compressor: int) -> bytes:
+    if compressor == COMPRESSORS["zlib"]:
+        return zlib.compress(data, 1)
+    if compressor == COMPRESSORS["lzma"]:
+        return lzma.compress(data)
+    return data
+
+
+def decompress(data: bytes, compressor: int) -> bytes:
+    if compressor == COMPRESSORS["zlib"]:
+        return zlib.decompress(data)
+    if compressor == COMPRESSORS["lzma"]:
+        return lzma.decompress(data)
+    if compressor == COMPRESSORS["none"]:
+        return data
+    raise ValueError(f"Unknown save compressor {compressor}.")
+
+
+class _DecompressingReader(io.RawIOBase):
+    """Reads `length` compressed bytes from `file`, decompressing `READ_SIZE` bytes of them at a time."""
+
+    def __init__(self, file: BinaryIO, length: int, compressor: int):
+        if compressor == COMPRESSORS["zlib"]:
+            self._decompressor: Any = zlib.decompressobj()
+        elif compressor == COMPRESSORS["lzma"]:
+            self._decompressor = lzma.LZMADecompressor()
+        elif compressor == COMPRESSORS["none"]:
+            self._decompressor = None
+        else:
+            raise ValueError(f"Unknown save compressor {compressor}.")
+        self._file = file
+        self._remaining = length
+        self._buffer = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while not self._buffer and self._remaining:
+            data = self._file.read(min(READ_SIZE, self._remaining))
+            if not data:
+                raise EOFError("Save file is truncated.")
+            self._remaining -= len(data)
+            self._buffer = memoryview(self._decompressor.decompress(data) if self._decompressor else data)
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def _read_exactly(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise EOFError("Save file is truncated.")
+    return data
+
+
+class _StatePickler(pickle.Pickler):
+    """Pickles the engine, maps and entities as references and collects the referenced maps and entities.
+
+    With `player`, the player is a reference too, for floor records which are loaded into a running game.
+    """
+
+    def __init__(self, file: io.BytesIO, engine: Engine, player: Optional[Entity] = None):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.engine = engine
+        self.player = player
+        self.entities: list[Entity] = []
+        self.maps: list[GameMap] = []
+        self._indexes: dict[int, int] = {}
+
+    def register(self, obj: Any, registry: list) -> int:
+        index = self._indexes.get(id(obj))
+        if index is None:
+            index = self._indexes[id(obj)] = len(registry)
+            registry.append(obj)
+        return index
+
+    def persistent_id(self, obj: Any) -> Optional[tuple]:
+        if obj is self.engine:
+            return ("engine",)
+        if obj is self.player and obj is not None:
+            return ("player",)
+        if isinstance(obj, Entity):
+            return "entity", self.register(obj, self.entities)
+        if isinstance(obj, GameMap):
+            return "map", self.register(obj, self.maps)
+        return None
+
+
+class _StateUnpickler(pickle.Unpickler):
+    def __init__(self, file: io.BytesIO, engine: Engine, entities: list[Entity], maps: list[GameMap]):
+        super().__init__(file)
+        self.engine = engine
+        self.entities = entities
+        self.maps = maps
+
+    def persistent_load(self, pid: tuple) -> Any:
+        match pid:
+            case ("engine",):
+                return self.engine
+            case ("player",):
+                return self.engine.player
+            case ("entity", index):
+                return self.entities[index]
+            case ("map", index):
+                return self.maps[index]
+        raise pickle.UnpicklingError(f"Unknown reference {pid!r} in save.")
+
+
+def _engine_state(engine: Engine) -> dict:
+    state = engine.__dict__.copy()
+    state["_player_distance"] = None
+    state["message_log"] = engine.message_log.without_history()
+    return state
+
+
+def _entity_state(entity: Entity) -> dict:
+    return {key: value for key, value in entity.__dict__.items() if key not in RECORD_FIELDS}
+
+
+def _map_state(game_map: GameMap) -> dict:
+    return {
+        key: value for key, value in game_map.__dict__.items() if key not in MAP_DERIVED and key not in MAP_ARRAYS
+    }
+
+
+def _dump_state(
+        engine: Engine, root: Any, player: Optional[Entity] = None
+) -> tuple[bytes, list[Entity], list[GameMap]]:
+    buffer = io.BytesIO()
+    pickler = _StatePickler(buffer, engine, player)
+    pickler.dump(root)
+
+    # Dumping a state can reference new entities or maps, keep going until all of them are written.
+    entities_done = maps_done = 0
+    while entities_done < len(pickler.entities) or maps_done < len(pickler.maps):
+        if entities_done < len(pickler.entities):
+            pickler.dump(("entity", entities_done, _entity_state(pickler.entities[entities_done])))
+            entities_done += 1
+        else:
+            game_map = pickler.maps[maps_done]
+            # Entities lying on a map are only referenced by its derived index, which isn't saved. Their order
+            # is, it decides e.g. the enemy turn order.
+            state = _map_state(game_map)
+            state["entity_order"] = [pickler.register(entity, pickler.entities) for entity in game_map.entities]
+            pickler.dump(("map", maps_done, state))
+            maps_done += 1
+    pickler.dump(None)
+    return buffer.getvalue(), pickler.entities, pickler.maps
+
+
+def _dump_maps(maps: list[GameMap]) -> bytes:
+    parts = [COUNT.pack(len(maps))]
+    for game_map in maps:
+        parts.append(MAP_SIZE.pack(game_map.width, game_map.height))
+        for name in MAP_ARRAYS:
+            parts.append(getattr(game_map, name).tobytes(order="F"))
+    return b"".join(parts)
+
+
+def _dump_entities(entities: list[Entity]) -> tuple[bytes, bytes]:
+    names: dict[str, int] = {}
+    records = np.array(
+        [
+            (
+                ENTITY_KINDS.index(type(entity)),
+                entity.x,
+                entity.y,
+                ord(entity.char),
+                entity.color,
+                names.setdefault(entity.name, len(names)),
+                entity.blocks_movement,
+                entity.render_order.value,
+                entity.dungeon_level,
+            )
+            for entity in entities
+        ],
+        dtype=ENTITY_DTYPE,
+    )
+    return COUNT.pack(len(entities)) + records.tobytes(), "\0".join(names).encode()
+
+
+@dataclass
+class Snapshot:
+    """The save of an engine before compression, see `snapshot`."""
+
+    body: bytes
+    # Message count and compressed data of the message history blocks.
+    history: list[tuple[int, bytes]]
+    # The saved entities in record order.
+    entities: list[Entity]
+
+
+def _dump_body(engine: Engine, root: Any, player: Optional[Entity] = None) -> tuple[bytes, list[Entity]]:
+    state, entities, maps = _dump_state(engine, root, player)
+    records, names = _dump_entities(entities)
+
+    body = io.BytesIO()
+    for name, payload in ((b"MAPS", _dump_maps(maps)), (b"ENTS", records), (b"NAME", names), (b"STAT", state)):
+        body.write(SECTION.pack(name, len(payload)))
+        body.write(payload)
+    return body.getvalue(), entities
+
+
+def snapshot(engine: Engine) -> Snapshot:
+    """Return the uncompressed save of the engine.
+
+    This is the only step which reads the game state, the snapshot can be packed and written on another thread.
+    """
+    body, entities = _dump_body(engine, _engine_state(engine))
+    return Snapshot(body, engine.message_log.history.raw_blocks(), entities)
+
+
+def pack(snapshot_: Snapshot, compressor: str = "zlib") -> bytes:
+    compressor_id = COMPRESSORS[compressor]
+    body = compress(snapshot_.body, compressor_id)
+
+    history = [COUNT.pack(len(snapshot_.history))]
+    for count, data in snapshot_.history:
+        history += [BLOCK.pack(count, len(data)), data]
+    history_size = sum(len(part) for part in history)
+
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, compressor_id, len(body)), body, SECTION.pack(b"HIST", history_size), *history
+    ])
+
+
+def dump_floor(game_map: GameMap, compressor: str = "zlib") -> bytes:
+    """Return a floor record: the header and body of a save holding only the map and its entities.
+
+    The engine and the player are references, `load_floor` links them to the engine loading the record.
+    """
+    engine = game_map.engine
+    body = compress(_dump_body(engine, game_map, engine.player)[0], COMPRESSORS[compressor])
+    return HEADER.pack(MAGIC, VERSION, COMPRESSORS[compressor], len(body)) + body
+
+
+def write_file(filename: str, data: bytes) -> None:
+    """Replace `filename` with `data` atomically, a crash leaves either the old or the new file.
+
+    The data is on disk before the rename, else a crash could leave the new name pointing at an empty file.
+    """
+    temporary = f"{filename}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, filename)
+    _sync_directory(filename)
+
+
+def _sync_directory(filename: str) -> None:
+    """Make the rename of `filename` durable, directories can't be opened for this on Windows."""
+    if os.name != "posix":
+        return
+    directory = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+_writer: Optional[ThreadPoolExecutor] = None
+# Background saves whose callbacks haven't run yet.
+_pending: list[tuple[Future, Callable[[Future], None]]] = []
+
+
+def get_writer() -> ThreadPoolExecutor:
+    """Return the thread writing the saves, one thread so saves of the same file land in order."""
+    global _writer
+    if _writer is None:
+        _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save-writer")
+    return _writer
+
+
+def wait_for_writes() -> None:
+    """Block until the background saves queued so far are written."""
+    if _writer is not None:
+        _writer.submit(lambda: None).result()
+
+
+def write_in_background(
+        filename: str, snapshot_: Snapshot, compressor: str = "zlib",
+        callback: Optional[Callable[[Future], None]] = None,
+) -> Future:
+    """Compress a `snapshot` and write it atomically on the writer thread.
+
+    `callback` gets the finished future, it is called on the main thread by `run_callbacks`.
+    """
+    future = get_writer().submit(lambda: write_file(filename, pack(snapshot_, compressor)))
+    if callback is not None:
+        _pending.append((future, callback))
+    return future
+
+
+def save_in_background(
+        engine: Engine, filename: str, compressor: str = "zlib", callback: Optional[Callable[[Future], None]] = None
+) -> Future:
+    """Snapshot the engine now, compress and write it on the writer thread."""
+    return write_in_background(filename, snapshot(engine), compressor, callback)
+
+
+def run_callbacks() -> None:
+    """Call the callbacks of the finished background saves, must be called from the main thread."""
+    for entry in [entry for entry in _pending if entry[0].done()]:
+        _pending.remove(entry)
+        future, callback = entry
+        callback(future)
+
+
+def save(engine: Engine, filename: str, compressor: str = "zlib") -> None:
+    """Save and wait for the file, after any background save still being written."""
+    save_in_background(engine, filename, compressor).result()
+
+
+def _read_section(file: BinaryIO, name: bytes) -> int:
+    found, length = SECTION.unpack(_read_exactly(file, SECTION.size))
+    if found != name:
+        raise ValueError(f"Expected save section {name!r}, found {found!r}.")
+    return length
+
+
+def _load_maps(file: BinaryIO) -> list[GameMap]:
+    _read_section(file, b"MAPS")
+    (count,) = COUNT.unpack(_read_exactly(file, COUNT.size))
+    maps = []
+    for _ in range(count):
+        width, height = MAP_SIZE.unpack(_read_exactly(file, MAP_SIZE.size))
+        game_map = GameMap(None, width, height)
+        for name, dtype in MAP_ARRAYS.items():
+            array = np.empty((width, height), dtype=dtype, order="F")
+            view = memoryview(array.reshape(-1, order="A").view(np.uint8))
+            if file.readinto(view) != len(view):
+                raise EOFError("Save file is truncated.")
+            setattr(game_map, name, array)
+        maps.append(game_map)
+    return maps
+
+
+def _load_entities(file: BinaryIO) -> list[Entity]:
+    _read_section(file, b"ENTS")
+    (count,) = COUNT.unpack(_read_exactly(file, COUNT.size))
+    records = np.frombuffer(_read_exactly(file, count * ENTITY_DTYPE.itemsize), dtype=ENTITY_DTYPE)
+    names = _read_exactly(file, _read_section(file, b"NAME")).decode().split("\0")
+    entities = []
+    for kind, x, y, char, entity_color, name, blocks_movement, render_order, dungeon_level in records.tolist():
+        entity = ENTITY_KINDS[kind].__new__(ENTITY_KINDS[kind])
+        entity.x = x
+        entity.y = y
+        entity.char = chr(char)
+        entity.color = tuple(entity_color)
+        entity.name = names[name]
+        entity.blocks_movement = blocks_movement
+        entity.render_order = RenderOrder(render_order)
+        entity.dungeon_level = dungeon_level
+        entities.append(entity)
+    return entities
+
+
+def _load_history(file: BinaryIO, log: MessageLog) -> None:
+    _read_section(file, b"HIST")
+    (block_count,) = COUNT.unpack(_read_exactly(file, COUNT.size))
+    for _ in range(block_count):
+        count, length = BLOCK.unpack(_read_exactly(file, BLOCK.size))
+        log.history.add_block(count, _read_exactly(file, length))
+
+
+def _read_body(file: BinaryIO, engine: Engine) -> tuple[Any, list[Entity]]:
+    """Read a body from a stream, return the first pickled object and the entities in record order."""
+    maps = _load_maps(file)
+    entities = _load_entities(file)
+
+    _read_section(file, b"STAT")
+    unpickler = _StateUnpickler(file, engine, entities, maps)
+    root = unpickler.load()
+    orders: dict[int, list[int]] = {}
+    while (record := unpickler.load()) is not None:
+        kind, index, state = record
+        if kind == "map":
+            orders[index] = state.pop("entity_order")
+        (entities if kind == "entity" else maps)[index].__dict__.update(state)
+
+    for index, game_map in enumerate(maps):
+        for entity_index in orders[index]:
+            game_map.add_entity(entities[entity_index])
+        game_map.on_tiles_changed()
+    return root, entities
+
+
+def _upgrade_legacy(engine: Engine) -> Engine:
+    """Add what the engine pickled by the previous format lacks: random streams and the derived map state.
+
+    Component states which changed shape are converted by their own `__setstate__`.
+    """
+    engine.__dict__.setdefault("_player_distance", None)
+    if "rng" not in engine.__dict__:
+        engine.rng = rng.RandomStreams(random.getrandbits(32))
+    engine.game_world.__dict__.setdefault("seed", engine.seed)
+    engine.game_world.__dict__.setdefault("_prefetch", None)
+
+    game_map = engine.game_map
+    entities = list(game_map.entities)
+    rebuilt = GameMap(engine, game_map.width, game_map.height)
+    for key in MAP_DERIVED:
+        setattr(game_map, key, getattr(rebuilt, key))
+    game_map.__dict__.setdefault("player_start", engine.player.position)
+    for entity in entities:
+        game_map.add_entity(entity)
+    game_map.on_tiles_changed()
+    return engine
+
+
+def _read_header(file: BinaryIO) -> tuple[int, int]:
+    """Read the header, return the compressor and the body length."""
+    _, version, compressor, body_length = HEADER.unpack(_read_exactly(file, HEADER.size))
+    if version != VERSION:
+        raise ValueError(f"Unsupported save format version {version}.")
+    return compressor, body_length
+
+
+def read(file: BinaryIO) -> tuple[Engine, list[Entity]]:
+    """Return the engine from a save file, or one of the previous format, and its entities in record order.
+
+    The previous format has no records, its entity list is empty.
+    """
+    start = file.tell()
+    magic = file.read(len(MAGIC))
+    file.seek(start)
+    if magic != MAGIC:
+        if magic != LEGACY_MAGIC:
+            raise ValueError("Not a save file.")
+        return _upgrade_legacy(pickle.loads(lzma.decompress(file.read()))), []
+
+    compressor, body_length = _read_header(file)
+    body_start = file.tell()
+    body = io.BufferedReader(_DecompressingReader(file, body_length, compressor), READ_SIZE)
+
+    engine = Engine.__new__(Engine)
+    state, entities = _read_body(body, engine)
+    engine.__dict__.update(state)
+
+    file.seek(body_start + body_length)
+    _load_history(file, engine.message_log)
+    return engine, entities
+
+
+def load_floor(data: bytes, engine: Engine) -> GameMap:
+    """Return the map of a record from `dump_floor`, linked to `engine`."""
+    file = io.BytesIO(data)
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a floor record.")
+    file.seek(0)
+    compressor, body_length = _read_header(file)
+    body = io.BufferedReader(_DecompressingReader(file, body_length, compressor), READ_SIZE)
+    return _read_body(body, engine)[0]
+
+
+def load(filename: str) -> Engine:
+    with open(filename, "rb") as f:
+        return read(f)[0]
@@ -2,13 +2,12 @@
 from __future__ import annotations
 
 import copy
-import lzma
-import pickle
 import traceback
 from typing import Optional
 
 import tcod
 
+import autosave
 import color
 import entities.equipment
 import entities.items
@@ -17,22 +16,24 @@ from config import Config
 from engine import Engine
 from game_map import GameWorld
 import input_handlers
+import rng
 
 # Load the background image and remove the alpha channel.
 background_image = tcod.image.load(Config.menu_bg_image)[:, :, :3]
 
 
-def new_game() -> Engine:
-    """Return a brand new game session as an Engine instance."""
+def new_game(seed: Optional[int] = None) -> Engine:
+    """Return a brand new game session as an Engine instance, random when `seed` is None."""
 
     player = copy.deepcopy(entities.player.player)
 
-    engine = Engine(player=player)
+    engine = Engine(player=player, seed=seed)
 
     engine.game_world = GameWorld(
         engine=engine,
         big_map=Config.big_map,
         little_map=Config.little_map,
+        seed=engine.seed,
     )
     engine.game_world.generate_floor()
     engine.update_fov()
@@ -62,9 +63,9 @@ def new_game() -> Engine:
 
 def load_game(filename: str) -> Engine:
     """Load an Engine instance from a file."""
-    with open(filename, "rb") as f:
-        engine = pickle.loads(lzma.decompress(f.read()))
+    engine = autosave.recover(filename, Config.save_journal)
     assert isinstance(engine, Engine)
+    rng.use(engine.rng)
     return engine
 
 
@@ -1,13 +1,217 @@
-from itertools import product
-
-values = sorted(["health", "mana", "power", "defense", "energy"])
-
-printed = False
-for f, s in product(values, values):
-    if s < f:
-        if not printed:
-            print()
-            printed = True
-        continue
-    print(f, s, sep="\t")
-    printed = False
+"""Headless game simulation for performance regression tests.
+
+Builds a game with `setup_game.new_game`, lets a simple bot play it through `EventHandler.handle_action`
+and reports turns per second together with the time spent in every turn phase, per floor.
+
+Floors are generated in the foreground, so "generate" is the cost of generating them. With `--prefetch` the
+next floor is generated by a worker process during the previous one, and "generate" only shows the wait for it.
+
+Run from the repository root:
+
+    python -m test_utils.dungeon_simulator --floors 30 --seed 1
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass
+from functools import wraps
+from typing import Callable, Optional, TYPE_CHECKING
+
+import tcod
+
+from actions import Action, DirectedActionDispatcher, PickupAction, TakeStairsAction, WaitAction
+from config import Config
+from entity import Item
+import input_handlers
+import setup_game
+
+if TYPE_CHECKING:
+    import numpy as np  # type: ignore
+
+    from engine import Engine
+    from game_map import GameMap
+
+DIRECTIONS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+# Stats the bot improves, in this order, with level up and boost points.
+STATS_CYCLE = ["constitution", "constitution", "strength", "dexterity"]
+
+PHASES = ["player", "enemies", "fov", "render", "generate"]
+
+
+@dataclass
+class FloorStats:
+    floor: int
+    turns: int = 0
+    player: float = 0.
+    enemies: float = 0.
+    fov: float = 0.
+    render: float = 0.
+    generate: float = 0.
+
+    @property
+    def total(self) -> float:
+        return sum(getattr(self, phase) for phase in PHASES)
+
+    @property
+    def turns_per_second(self) -> float:
+        return self.turns / self.total if self.total else 0.
+
+
+class Bot:
+    """Walks to the stairs, fighting monsters on the way, picking up items and drinking health potions."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.stat_index = 0
+        self._stairs_map: Optional[GameMap] = None
+        self._stairs_distance: Optional[np.ndarray] = None
+
+    def improve_stat(self) -> None:
+        self.engine.player.level.increase_stat(STATS_CYCLE[self.stat_index % len(STATS_CYCLE)], log=False)
+        self.stat_index += 1
+
+    def stairs_distance(self) -> np.ndarray:
+        game_map = self.engine.game_map
+        if self._stairs_map is not game_map:
+            self._stairs_map = game_map
+            self._stairs_distance = game_map.get_distance_map(*game_map.downstairs_location)
+        return self._stairs_distance
+
+    def choose_action(self) -> Action:
+        player = self.engine.player
+        game_map = self.engine.game_map
+
+        if player.fighter.hp < player.fighter.max_hp * 0.3:
+            for item in player.inventory.items:
+                if item.name == "Health Potion":
+                    action = item.consumable.get_action(player)
+                    if isinstance(action, Action):
+                        return action
+
+        for dx, dy in DIRECTIONS:
+            if game_map.get_actor_at_location_abs(player.x + dx, player.y + dy):
+                return DirectedActionDispatcher(player, dx, dy)
+
+        if len(player.inventory.items) < player.inventory.capacity and any(
+                isinstance(entity, Item) for entity in game_map.get_entities_at_location(*player.position)
+        ):
+            return PickupAction(player)
+
+        if player.position == game_map.downstairs_location:
+            return TakeStairsAction(player)
+
+        path = tcod.path.hillclimb2d(self.stairs_distance(), player.position, True, True)
+        if len(path) > 1:
+            x, y = path[1].tolist()
+            return DirectedActionDispatcher(player, x - player.x, y - player.y)
+        return WaitAction(player)
+
+
+def _timed(function: Callable, record: Callable[[float], None]) -> Callable:
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(time.perf_counter() - start)
+
+    return wrapper
+
+
+def simulate(floors: int = 30, max_turns: int = 50_000, seed: int = 0, boost: int = 200,
+             render_every: int = 1, prefetch: bool = False) -> list[FloorStats]:
+    """Play a new game until the bot reaches `floors`, dies or runs out of turns and return timings by floor."""
+    Config.prefetch_floors = prefetch
+    engine = setup_game.new_game(seed)
+    handler = input_handlers.MainGameEventHandler(engine)
+    console = tcod.console.Console(Config.screen.width, Config.screen.height, order="F")
+    bot = Bot(engine)
+    for _ in range(boost):
+        engine.player.fighter.stats.remains += 1
+        bot.improve_stat()
+    engine.player.fighter.heal(engine.player.fighter.max_hp)
+
+    stats = {1: FloorStats(1)}
+    # Time spent in nested phases during the current player action, subtracted from the action itself.
+    nested = [0.]
+
+    def recorder(phase: str) -> Callable[[float], None]:
+        def record(elapsed: float) -> None:
+            floor = engine.game_world.current_floor
+            floor_stats = stats.setdefault(floor, FloorStats(floor))
+            setattr(floor_stats, phase, getattr(floor_stats, phase) + elapsed)
+            nested[0] += elapsed
+
+        return record
+
+    # Instance attributes shadow the methods, so handle_action calls the timed versions.
+    engine.handle_enemy_turns = _timed(engine.handle_enemy_turns, recorder("enemies"))
+    engine.update_fov = _timed(engine.update_fov, recorder("fov"))
+    engine.game_world.generate_floor = _timed(engine.game_world.generate_floor, recorder("generate"))
+
+    for turn in range(max_turns):
+        floor = engine.game_world.current_floor
+        if floor > floors or not engine.player.is_alive:
+            break
+        floor_stats = stats.setdefault(floor, FloorStats(floor))
+
+        action = bot.choose_action()
+        nested[0] = 0.
+        start = time.perf_counter()
+        if handler.handle_action(action):
+            floor_stats.turns += 1
+        floor_stats.player += time.perf_counter() - start - nested[0]
+
+        if engine.player.level.requires_level_up:
+            engine.player.fighter.stats.remains += 1
+            engine.player.level.increase_level()
+            bot.improve_stat()
+
+        if turn % render_every == 0:
+            start = time.perf_counter()
+            console.clear()
+            handler.on_render(console)
+            floor_stats.render += time.perf_counter() - start
+
+    return [stats[floor] for floor in sorted(stats) if floor <= floors]
+
+
+def print_report(results: list[FloorStats]) -> None:
+    header = f"{'floor':>5} {'turns':>6} {'turns/s':>9}" + "".join(f" {phase + ' ms':>11}" for phase in PHASES)
+    print(header)
+    for floor_stats in results:
+        print(
+            f"{floor_stats.floor:>5} {floor_stats.turns:>6} {floor_stats.turns_per_second:>9.1f}"
+            + "".join(f" {getattr(floor_stats, phase) * 1000:>11.1f}" for phase in PHASES)
+        )
+
+    total = FloorStats(0)
+    for floor_stats in results:
+        total.turns += floor_stats.turns
+        for phase in PHASES:
+            setattr(total, phase, getattr(total, phase) + getattr(floor_stats, phase))
+    print(f"Total: {total.turns} turns in {total.total:.2f} s, {total.turns_per_second:.1f} turns/s")
+    for phase in PHASES:
+        share = getattr(total, phase) / total.total * 100 if total.total else 0.
+        print(f"  {phase:>8}: {getattr(total, phase):7.2f} s ({share:4.1f}%)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--floors", type=int, default=30, help="stop after this floor")
+    parser.add_argument("--max-turns", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--boost", type=int, default=200, help="stat points given to the player at start")
+    parser.add_argument("--render-every", type=int, default=1, help="render one frame every N turns")
+    parser.add_argument("--prefetch", action="store_true", help="generate the next floor in a worker process")
+    args = parser.parse_args()
+
+    results = simulate(args.floors, args.max_turns, args.seed, args.boost, args.render_every, args.prefetch)
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Dungeon generation throughput benchmark.
+
+Generates many floors for every map config with `procgen.generate_map`, without an engine,
+and reports maps per second and the memory retained by one map.
+
+Run from the repository root:
+
+    python -m test_utils.generation_benchmark --count 1000 --floor 5
+"""
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+from config import Config, MapConfig
+from procgen import generate_map
+import rng
+
+CONFIGS = {
+    "little_map": Config.little_map,
+    "big_map": Config.big_map,
+}
+
+
+@dataclass
+class GenerationStats:
+    name: str
+    count: int
+    seconds: float
+    bytes_per_map: float
+    entities_per_map: float
+
+    @property
+    def maps_per_second(self) -> float:
+        return self.count / self.seconds if self.seconds else 0.
+
+
+def benchmark(name: str, config: MapConfig, count: int, floor: int, memory_samples: int = 10) -> GenerationStats:
+    entities = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        entities += len(generate_map(config, floor).entities)
+    seconds = time.perf_counter() - start
+
+    # Tracing slows allocations down a lot, so memory is measured on a few extra maps only.
+    retained = 0
+    for _ in range(memory_samples):
+        tracemalloc.start()
+        game_map = generate_map(config, floor)
+        retained += tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del game_map
+
+    return GenerationStats(name, count, seconds, retained / max(1, memory_samples), entities / max(1, count))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000, help="maps to generate for every config")
+    parser.add_argument("--floor", type=int, default=5, help="floor number used for entity spawning")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--memory-samples", type=int, default=10)
+    parser.add_argument("--config", choices=sorted(CONFIGS), action="append", help="default: all configs")
+    args = parser.parse_args()
+
+    print(f"{'config':>12} {'maps':>7} {'seconds':>8} {'maps/s':>8} {'KiB/map':>8} {'entities/map':>13}")
+    for name in args.config or CONFIGS:
+        rng.use(rng.RandomStreams(args.seed))
+        stats = benchmark(name, CONFIGS[name], args.count, args.floor, args.memory_samples)
+        print(
+            f"{stats.name:>12} {stats.count:>7} {stats.seconds:>8.2f} {stats.maps_per_second:>8.1f}"
+            f" {stats.bytes_per_map / 1024:>8.1f} {stats.entities_per_map:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
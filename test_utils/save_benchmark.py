@@ -0,0 +1,116 @@
+"""Save and load benchmark: the versioned save format against the previous pickle + LZMA dump of the engine.
+
+Plays a game with the simulator bot to get a realistic state, then reports the size of the save and the time
+to save and load it with every compressor.
+
+Run from the repository root:
+
+    python -m test_utils.save_benchmark --turns 3000 --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import lzma
+import os
+import pickle
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from config import Config
+import input_handlers
+import savegame
+import setup_game
+from engine import Engine
+from test_utils.dungeon_simulator import Bot
+
+
+@dataclass
+class SaveStats:
+    name: str
+    size: int
+    save: float
+    load: float
+
+
+def play(turns: int, seed: int, boost: int) -> Engine:
+    """Return the engine after the simulator bot played `turns` turns."""
+    engine = setup_game.new_game(seed)
+    handler = input_handlers.MainGameEventHandler(engine)
+    bot = Bot(engine)
+    for _ in range(boost):
+        engine.player.fighter.stats.remains += 1
+        bot.improve_stat()
+    engine.player.fighter.heal(engine.player.fighter.max_hp)
+
+    for _ in range(turns):
+        if not engine.player.is_alive:
+            break
+        handler.handle_action(bot.choose_action())
+        if engine.player.level.requires_level_up:
+            engine.player.fighter.stats.remains += 1
+            engine.player.level.increase_level()
+            bot.improve_stat()
+    return engine
+
+
+def _legacy_save(engine: Engine, filename: str) -> None:
+    with open(filename, "wb") as f:
+        f.write(lzma.compress(pickle.dumps(engine)))
+
+
+def _legacy_load(filename: str) -> Engine:
+    with open(filename, "rb") as f:
+        return pickle.loads(lzma.decompress(f.read()))
+
+
+def benchmark(name: str, save: Callable[[Engine, str], None], load: Callable[[str], Engine], engine: Engine,
+              repeat: int) -> SaveStats:
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "benchmark.sav")
+        start = time.perf_counter()
+        for _ in range(repeat):
+            save(engine, filename)
+        save_seconds = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            load(filename)
+        load_seconds = (time.perf_counter() - start) / repeat
+
+        return SaveStats(name, os.path.getsize(filename), save_seconds, load_seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=3000, help="turns played before saving")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--boost", type=int, default=200, help="stat points given to the player at start")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    Config.prefetch_floors = False
+    engine = play(args.turns, args.seed, args.boost)
+    print(
+        f"floor {engine.game_world.current_floor}, turn {engine.turn}, {len(engine.game_map.entities)} entities,"
+        f" {len(engine.message_log)} messages"
+    )
+
+    results = [benchmark("pickle+lzma", _legacy_save, _legacy_load, engine, args.repeat)]
+    for compressor in savegame.COMPRESSORS:
+        results.append(benchmark(
+            f"v{savegame.VERSION} {compressor}",
+            lambda engine_, filename, compressor_=compressor: savegame.save(engine_, filename, compressor_),
+            savegame.load,
+            engine,
+            args.repeat,
+        ))
+
+    print(f"{'format':>12} {'KiB':>9} {'save ms':>9} {'load ms':>9}")
+    for stats in results:
+        print(f"{stats.name:>12} {stats.size / 1024:>9.1f} {stats.save * 1000:>9.1f} {stats.load * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
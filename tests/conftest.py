@@ -0,0 +1,12 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Assets like the menu background are loaded relative to the repository root.
+os.chdir(ROOT)
+
+from config import Config  # noqa: E402
+
+# Worker processes make no difference to the game, tests generate floors in process.
+Config.prefetch_floors = False
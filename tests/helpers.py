@@ -0,0 +1,42 @@
+"""A game played by the simulator bot, shared by the tests."""
+from __future__ import annotations
+
+from engine import Engine
+import input_handlers
+import setup_game
+from test_utils.dungeon_simulator import Bot
+
+
+class BotGame:
+    """A new game with `boost` extra stat points, played by the bot through the main event handler."""
+
+    def __init__(self, seed: int, boost: int = 200):
+        self.engine = setup_game.new_game(seed)
+        self.handler = input_handlers.MainGameEventHandler(self.engine)
+        self.bot = Bot(self.engine)
+        for _ in range(boost):
+            self.engine.player.fighter.stats.remains += 1
+            self.bot.improve_stat()
+        self.engine.player.fighter.heal(self.engine.player.fighter.max_hp)
+
+    def play(self, turns: int) -> Engine:
+        """Play `turns` turns or until the player dies, the bot spends the level ups."""
+        engine = self.engine
+        for _ in range(turns):
+            if not engine.player.is_alive:
+                break
+            self.handler.handle_action(self.bot.choose_action())
+            if engine.player.level.requires_level_up:
+                engine.player.fighter.stats.remains += 1
+                engine.player.level.increase_level()
+                self.bot.improve_stat()
+            self.on_turn()
+        return engine
+
+    def on_turn(self) -> None:
+        """Called after every turn."""
+
+
+def play(turns: int, seed: int, boost: int = 200) -> Engine:
+    """Return the engine after the bot played `turns` turns of a new game."""
+    return BotGame(seed, boost).play(turns)
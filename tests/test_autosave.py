@@ -0,0 +1,94 @@
+import pytest
+
+from actions import PlaceTorchAction, WaitAction
+import autosave
+from entity import Torch
+from helpers import BotGame
+import savegame
+
+
+def _journaled(engine) -> tuple:
+    """The state the journal restores, the random streams and AI state come back as they were on the save."""
+    player = engine.player
+    log = engine.message_log
+    return (
+        sorted((e.name, e.x, e.y, e.char, e.render_order, getattr(e, "fighter", None) and e.fighter.hp)
+               for e in engine.game_map.entities),
+        [item.name for item in player.inventory.items], player.level.current_level, player.level.current_xp,
+        engine.game_map.explored.tobytes(), [(m.full_text, m.fg) for m in log.get_range(0, len(log))],
+        engine.turn, engine.game_world.current_floor,
+    )
+
+
+class Game(BotGame):
+    """A bot game autosaved after every turn."""
+
+    def __init__(self, tmp_path, seed: int):
+        super().__init__(seed)
+        self.filename = str(tmp_path / "game.sav")
+        self.journal_filename = str(tmp_path / "game.journal")
+        self.autosave = autosave.Autosave(self.filename, self.journal_filename)
+        self.autosave.update(self.engine)
+
+    def on_turn(self) -> None:
+        self.autosave.update(self.engine)
+
+    def recover(self):
+        savegame.wait_for_writes()
+        return autosave.recover(self.filename, self.journal_filename)
+
+
+@pytest.fixture
+def game(tmp_path):
+    game = Game(tmp_path, 4)
+    yield game
+    game.autosave.close()
+
+
+def test_recover_replays_the_journal(game):
+    game.play(150)
+    assert game.engine.player.is_alive
+    recovered = game.recover()
+    assert _journaled(recovered) == _journaled(game.engine)
+    assert recovered.player.game_map is recovered.game_map
+
+
+def test_recover_without_journal(game):
+    savegame.wait_for_writes()
+    game.autosave.close()
+    expected = _journaled(savegame.load(game.filename))
+    with open(game.journal_filename, "wb"):
+        pass
+    assert _journaled(game.recover()) == expected
+
+
+def test_truncated_frame_ends_the_replay(game):
+    game.play(100)
+    while game.engine.player.is_alive:
+        expected = _journaled(game.engine)
+        turn, floor = game.engine.turn, game.engine.game_world.current_floor
+        game.play(1)
+        if game.engine.game_world.current_floor == floor and game.engine.turn != turn:
+            break  # The last turn wrote a frame to the same journal.
+    game.autosave.close()
+
+    with open(game.journal_filename, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 1)
+    assert _journaled(game.recover()) == expected
+
+
+def test_recover_removed_torch(game):
+    player = game.engine.player
+    game.handler.handle_action(PlaceTorchAction(player))
+    game.autosave.update(game.engine)
+    game.handler.handle_action(WaitAction(player))
+    game.autosave.update(game.engine)
+    assert any(isinstance(entity, Torch) for entity in game.engine.game_map.entities)
+
+    game.handler.handle_action(PlaceTorchAction(player))  # Placing a torch where one lies removes it.
+    game.autosave.update(game.engine)
+    assert not any(isinstance(entity, Torch) for entity in game.engine.game_map.entities)
+
+    recovered = game.recover()
+    assert not any(isinstance(entity, Torch) for entity in recovered.game_map.entities)
+    assert _journaled(recovered) == _journaled(game.engine)
@@ -0,0 +1,41 @@
+import components.ai
+from combat import Damage, DamageType, Defense
+from components import effects
+import entities.enemies
+from ranged_value import Range
+import rng
+import setup_game
+
+
+def test_describe_keeps_the_order_types_were_added():
+    defense = Defense({DamageType.FIRE: (Range(10), Range(1, 2)), DamageType.PHYSICAL: (Range(0), Range(3))})
+    defense += Defense({DamageType.MAGIC: (Range(5), Range(0)), DamageType.FIRE: (Range(5), Range(1))})
+    assert defense.describe() == ["Fire: 15%, 2-3", "Physical: 0%, 3", "Magic: 5%, 0"]
+
+    other = Defense({DamageType.POISON: (Range(0), Range(1))}) + defense
+    assert other.describe() == ["Poison: 0%, 1", "Fire: 15%, 2-3", "Physical: 0%, 3", "Magic: 5%, 0"]
+
+    defense = Defense()
+    defense += Range(2)
+    assert defense.describe() == ["Physical: 0%, 2"]
+
+
+def test_area_damage_rolls_every_target():
+    engine = setup_game.new_game(3)
+    rng.use(engine.rng)
+    player = engine.player
+    orcs = []
+    for dx in (1, 2, 3):
+        orc = entities.enemies.orc.construct(1)
+        orc.place(player.x + dx, player.y, engine.game_map)
+        orcs.append(orc)
+    before = [orc.fighter.hp for orc in orcs]
+
+    effect = effects.Combine([
+        effects.DamageEffect(Damage(Range(10, 15), DamageType.FIRE)),
+        effects.AddConfusionEffect(1),
+    ])
+    effect.parent = player
+    assert effect.apply_all(orcs, True)
+    assert all(10 <= hp - orc.fighter.hp <= 15 or not orc.is_alive for hp, orc in zip(before, orcs))
+    assert all(isinstance(orc.ai, components.ai.ConfusedEnemy) for orc in orcs if orc.is_alive)
@@ -0,0 +1,18 @@
+from helpers import play
+
+
+def _play_log(seed: int, turns: int, padding: int) -> list[tuple[str, tuple[int, int, int]]]:
+    # Objects kept alive while playing shift the addresses of everything allocated after them, which changes
+    # the iteration order of anything hashed by id.
+    ballast = [object() for _ in range(padding)]
+    engine = play(turns, seed, boost=200)
+    log = engine.message_log
+    del ballast
+    return [(message.full_text, message.fg) for message in log.get_range(0, len(log))]
+
+
+def test_same_seed_same_game():
+    first = _play_log(11, 1500, padding=0)
+    assert len(first) > 100
+    assert _play_log(11, 1500, padding=12345) == first
+    assert _play_log(11, 1500, padding=777) == first
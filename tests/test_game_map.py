@@ -0,0 +1,28 @@
+from config import Config
+import setup_game
+
+
+def _floor_state(engine) -> tuple:
+    game_map = engine.game_map
+    return (
+        game_map.tiles.tobytes(), game_map.explored.tobytes(), game_map.downstairs_location,
+        [(entity.name, entity.x, entity.y) for entity in game_map.entities if entity is not engine.player],
+    )
+
+
+def test_revisited_floors_are_unchanged(monkeypatch):
+    # No floor is kept in memory, every floor left is spilled to disk and loaded back on the next visit.
+    monkeypatch.setattr(Config, "floor_cache_size", 0)
+    engine = setup_game.new_game(7)
+    world = engine.game_world
+    states = {}
+    for floor in range(2, 6):
+        states[world.current_floor] = _floor_state(engine)
+        world.change_floor(floor)
+
+    for visit in range(60):
+        states[world.current_floor] = _floor_state(engine)
+        world.change_floor(1 + visit % 5)
+        assert _floor_state(engine) == states[world.current_floor]
+        assert engine.player.game_map is engine.game_map
+    assert world.visited_floors == [floor for floor in range(1, 6) if floor != world.current_floor]
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from config import Config
+import exceptions
+import input_handlers
+import rng
+import savegame
+from helpers import play
+from test_utils.dungeon_simulator import Bot
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# What the save of the previous format in `baseline.sav`, a pickled engine compressed with LZMA, holds.
+BASELINE = dict(
+    floor=2, turn=739, hp=100, xp=1345, position=(112, 40), entities=19, messages=666,
+    last="That way is blocked. (x7)", inventory=18,
+)
+
+
+def _facts(engine) -> dict:
+    player = engine.player
+    log = engine.message_log
+    return dict(
+        floor=engine.game_world.current_floor, turn=engine.turn, hp=player.fighter.hp, xp=player.level.current_xp,
+        position=player.position, entities=len(engine.game_map.entities), messages=len(log),
+        last=log.recent[-1].full_text, inventory=len(player.inventory.items),
+    )
+
+
+def _state(engine) -> tuple:
+    """What a save must restore, entities in map order."""
+    game_map = engine.game_map
+    player = engine.player
+    log = engine.message_log
+    return (
+        [(e.name, e.x, e.y, e.char, e.color, e.blocks_movement, e.render_order, tuple(e.description()))
+         for e in game_map.entities],
+        game_map.tiles.tobytes(), game_map.explored.tobytes(), game_map.downstairs_location,
+        [item.name for item in player.inventory.items], player.fighter.hp, player.fighter.mp, player.fighter.stats,
+        str(player.fighter.power), player.fighter.defense.values,
+        [(m.full_text, m.fg) for m in log.get_range(0, len(log))],
+        engine.turn, engine.seed, engine.rng.combat.getstate(), engine.game_world.visited_floors,
+    )
+
+
+def _save_and_load(engine, tmp_path, compressor: str = "zlib"):
+    filename = str(tmp_path / "game.sav")
+    savegame.save(engine, filename, compressor)
+    return savegame.load(filename)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return play(600, 5, boost=200)
+
+
+@pytest.mark.parametrize("compressor", sorted(savegame.COMPRESSORS))
+def test_round_trip(engine, tmp_path, compressor):
+    loaded = _save_and_load(engine, tmp_path, compressor)
+    assert _state(loaded) == _state(engine)
+    assert loaded.player.game_map is loaded.game_map and loaded.game_map.engine is loaded
+
+
+def test_round_trip_keeps_history_and_floors(engine, tmp_path):
+    for index in range(2000):
+        engine.message_log.add_message(f"Message {index}")
+    assert len(engine.message_log.history) > 0
+    loaded = _save_and_load(engine, tmp_path)
+    assert _state(loaded) == _state(engine)
+
+    # Left floors come back from their records.
+    world = loaded.game_world
+    world.change_floor(world.current_floor - 1)
+    assert loaded.player.position == loaded.game_map.downstairs_location
+    assert all(entity.parent is loaded.game_map for entity in loaded.game_map.entities)
+
+
+def test_load_previous_format(tmp_path):
+    engine = savegame.load(os.path.join(FIXTURES, "baseline.sav"))
+    assert _facts(engine) == BASELINE
+
+    # The game goes on and saves in the current format.
+    rng.use(engine.rng)
+    handler = input_handlers.MainGameEventHandler(engine)
+    bot = Bot(engine)
+    for _ in range(50):
+        engine.player.fighter.heal(engine.player.fighter.max_hp)
+        handler.handle_action(bot.choose_action())
+    assert _state(_save_and_load(engine, tmp_path)) == _state(engine)
+
+
+def test_truncated_save(engine, tmp_path):
+    filename = str(tmp_path / "game.sav")
+    savegame.save(engine, filename)
+    with open(filename, "rb") as f:
+        data = f.read()
+    for size in (savegame.HEADER.size - 1, savegame.HEADER.size + 10, len(data) // 2, len(data) - 1):
+        with open(filename, "wb") as f:
+            f.write(data[:size])
+        with pytest.raises((EOFError, ValueError)):
+            savegame.load(filename)
+
+
+def test_not_a_save(tmp_path):
+    filename = str(tmp_path / "game.sav")
+    with open(filename, "wb") as f:
+        f.write(b"not a save file at all")
+    with pytest.raises(ValueError, match="Not a save file"):
+        savegame.load(filename)
+
+
+def test_unsupported_version(engine, tmp_path):
+    filename = str(tmp_path / "game.sav")
+    savegame.save(engine, filename)
+    with open(filename, "r+b") as f:
+        f.seek(len(savegame.MAGIC))
+        f.write((savegame.VERSION + 1).to_bytes(2, "little"))
+    with pytest.raises(ValueError, match="Unsupported save format version"):
+        savegame.load(filename)
+
+
+def test_game_over_deletes_a_save_being_written(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "save_name", str(tmp_path / "game.sav"))
+    monkeypatch.setattr(Config, "save_journal", str(tmp_path / "game.journal"))
+    savegame.save_in_background(engine, Config.save_name, "lzma")
+    with pytest.raises(exceptions.QuitWithoutSaving):
+        input_handlers.GameOverEventHandler(engine).on_quit()
+    savegame.wait_for_writes()
+    assert not os.path.exists(Config.save_name)
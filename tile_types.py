@@ -54,3 +54,9 @@ down_stairs = new_tile(
     dark=(ord(">"), (255, 255, 255), (50, 50, 150)),
     light=(ord(">"), (255, 255, 255), (200, 180, 50)),
 )
+up_stairs = new_tile(
+    walkable=True,
+    transparent=True,
+    dark=(ord("<"), (255, 255, 255), (50, 50, 150)),
+    light=(ord("<"), (255, 255, 255), (200, 180, 50)),
+)